@@ -0,0 +1,62 @@
+"""This file contains the benchmarks.
+
+Each ".sqm" file in this directory is a benchmark workload.  Run them all
+with "make bench" from the src directory, or name the ones you want on the
+command line:
+
+    cd src
+    python ../bench/bench.py fib.sqm
+
+Each workload is run through the Shell (with its output thrown away), and
+the best of a few wall-clock times is reported.  Since some of the workloads
+recurse deeply, they're run in a thread with a big stack and a high
+recursion limit.
+
+"""
+
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+REPEAT = 3
+RECURSION_LIMIT = 100000
+STACK_SIZE = 256 * 1024 * 1024
+
+
+def time_workload(path):
+    """Run the given .sqm file through the Shell, and return the best time."""
+    from Shell import Shell
+    best = None
+    for i in range(REPEAT):
+        stdout, argv = sys.stdout, sys.argv
+        sys.stdout, sys.argv = open(os.devnull, "w"), ["squeamish", path]
+        try:
+            start = time.time()
+            Shell().mainLoop()
+            elapsed = time.time() - start
+        finally:
+            sys.stdout.close()
+            sys.stdout, sys.argv = stdout, argv
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(names):
+    if not names:
+        names = [i for i in os.listdir(BENCH_DIR) if i.endswith(".sqm")]
+        names.sort()
+    for name in names:
+        elapsed = time_workload(os.path.join(BENCH_DIR, name))
+        print "%-24s %8.3fs" % (name, elapsed)
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    threading.stack_size(STACK_SIZE)
+    thread = threading.Thread(target = main, args = (sys.argv[1:],))
+    thread.start()
+    thread.join()
@@ -0,0 +1,82 @@
+"""This file benchmarks the reader.
+
+It generates a few megabytes of source code and of data, and a string
+literal of about a megabyte that's full of backslash sequences, and times
+how long reader.parse_all takes to read them.  If the old PLY based parser
+module can be imported, it times yacc.parse on the same forms, one at a time
+(it can only parse one list at a time), for comparison:
+
+    cd src
+    python ../bench/read.py
+
+"""
+
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+REPEAT = 3
+
+
+def make_source(count):
+    """Return a list of count function definitions."""
+    form = '''(def fib%d(n)
+  # Compute a Fibonacci number.
+  (if (< n 2) (
+    n
+  ) else (
+    (print "fib\\t" n "\\n")
+    (+ (fib%d (- n 1)) (fib%d (- n 2)) 0.0 -1.5e-3)
+  ))
+)
+'''
+    return [form % (i, i, i) for i in range(count)]
+
+def make_data(count):
+    """Return a list of count records."""
+    form = '(record %d "name %d" %d.25 (tags "a" "b \\"c\\"") ((1 2) (3 4)))\n'
+    return [form % (i, i, i) for i in range(count)]
+
+def make_literal(size):
+    """Return a list of one form containing a string literal of size bytes."""
+    chunk = r'Text with \"escapes\"\n\tand \x41 \u00e9 \\ in it. '
+    return ['(= s "%s")\n' % (chunk * (size / len(chunk)))]
+
+def best_time(f, *args):
+    """Call f(*args) REPEAT times, and return the best wall-clock time."""
+    best = None
+    for i in range(REPEAT):
+        start = time.time()
+        f(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def parse_each(parse, forms):
+    for i in forms:
+        parse(i)
+
+def main():
+    from reader import parse_all
+    try:
+        from parser import yacc
+    except ImportError:
+        yacc = None
+    for (name, forms) in [("source", make_source(10000)),
+                          ("data", make_data(40000)),
+                          ("literal", make_literal(1024 * 1024))]:
+        text = "".join(forms)
+        size = len(text) / (1024.0 * 1024.0)
+        line = "%-8s %6.2fMB  reader %8.3fs" % (
+            name, size, best_time(parse_all, text))
+        if yacc is not None:
+            line += "  yacc %8.3fs" % best_time(parse_each, yacc.parse, forms)
+        print line
+
+
+if __name__ == '__main__':
+    main()
@@ -47,6 +47,32 @@ class AutomaticClass:
         return "<%s %s>" % (self.__class__.__name__, " ".join(attributes))
 
 
+class SlottedClass(object):
+
+    """This is a base class for small, frequently created struct-like classes.
+
+    It's like AutomaticClass, but subclasses list their attributes in 
+    __slots__ and write their own __init__.  That way, construction doesn't
+    have to go through getAttributes or **kargs, and instances don't have a
+    __dict__.  Slots that haven't been set are simply missing, so hasattr
+    works as expected.
+
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        """Return a suitable string representing of this instance."""
+        attributes = []
+        for i in self.__slots__:
+            try: 
+                value = getattr(self, i)
+            except AttributeError: 
+                value = "Undefined"
+            attributes.append("%s=%s" % (i, value))
+        return "<%s %s>" % (self.__class__.__name__, " ".join(attributes))
+
+
 # This is for testing.
 class _Test(AutomaticClass):
     def __init__(self, **kargs):
@@ -55,9 +81,18 @@ class _Test(AutomaticClass):
     def getAttributes(self):
         return AutomaticClass.getAttributes(self) + ["foo"]
 
+class _SlottedTest(SlottedClass):
+    __slots__ = ["foo", "bar"]
+    def __init__(self, foo = "Bar"):
+        self.foo = foo
+
 
 # Do some testing.
 if __name__ == '__main__': 
     assert `_Test()` == "<_Test foo=Bar>"
     assert _Test().foo == "Bar"
     assert _Test(foo = "Not bar").foo == "Not bar"
+    assert `_SlottedTest()` == "<_SlottedTest foo=Bar bar=Undefined>"
+    assert _SlottedTest(foo = "Not bar").foo == "Not bar"
+    assert not hasattr(_SlottedTest(), "bar")
+    assert not hasattr(_SlottedTest(), "__dict__")
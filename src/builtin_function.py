@@ -3,7 +3,6 @@
 from __future__ import nested_scopes 
 
 from Symbol import Symbol
-from Expression import Expression
 from Parameter import Parameter
 
 
@@ -12,29 +11,37 @@ def create_builtin_function(name, function):
     """Return a builtin function.
 
     This function creates a closure for the returned function.  The returned 
-    function will have the "lazy" attribute set to 1.
+    function will have the "lazy" attribute set to 1, and the "function"
+    attribute set to function.
 
     name - This is a string.
 
-    function - This is the actual Python function.
+    function - This is the actual Python function.  If it has the
+    "needsEnviron" attribute set, it's passed the caller's Environ, followed
+    by the Parameter's.
 
     """
 
+    needsEnviron = hasattr(function, "needsEnviron")
+
     def closure(environ, *args):
         """Apply the function to args, and return the results.
 
-        Wrap each argument in a Parameter instance before applying the 
-        function.  Please see Parameter.py and builtins.py.
+        Each argument is an Expression.  Wrap each argument in a Parameter
+        instance before applying the function.  Please see Parameter.py and
+        builtins.py.
 
         """
         parameters = []
         for i in args:
-            expression = Expression(environ = environ, parseTree = i)
-            parameter = Parameter(value = expression)
+            parameter = Parameter(value = i)
             parameters.append(parameter)
+        if needsEnviron:
+            return function(environ, *parameters)
         return function(*parameters)
 
     closure.lazy = 1
+    closure.function = function
     return closure
 
 
@@ -46,5 +53,6 @@ if __name__ == '__main__':
     def builtin_add(a, b): return a() + b()
     locals["+"] = create_builtin_function("+", builtin_add)
     assert hasattr(locals["+"], "lazy")
+    assert locals["+"].function is builtin_add
     plus = Symbol(name = "+")
     assert evaluate([plus, 1, [plus, 1, 1]], locals) == 3
@@ -18,14 +18,16 @@ to:
 
     def add(a, b): return a() + b()
 
+A builtin that has the "needsEnviron" attribute set is also passed the
+caller's Environ, as its first argument.  It needs that in order to call
+user-defined functions (see _get_python_function).
+
 """
 
 import operator
 import sys
 
-from Parameter import Parameter
-from Expression import Expression
-from Symbol import Symbol
+from Stream import Stream, take, from_iterator, stream_map, stream_filter
 
 
 def builtin_eq(a, b): return a() == b()
@@ -39,8 +41,8 @@ def builtin_mul(*args): return _lazy_reduce(operator.mul, args)
 def builtin_div(a, b): return a() / b()
 def builtin_truediv(a, b): return operator.truediv(a(), b())
 def builtin_mod(a, b): return a() % b()
-def builtin_and(*args): return _lazy_reduce(operator.__and__, args)
-def builtin_or(*args): return _lazy_reduce(operator.__or__, args)
+def builtin_bitand(*args): return _lazy_reduce(operator.__and__, args)
+def builtin_bitor(*args): return _lazy_reduce(operator.__or__, args)
 def builtin_xor(a, b): return operator.xor(a(), b())
 def builtin_not(n): return not n()
 def builtin_inv(n): return ~n()
@@ -62,56 +64,35 @@ def builtin_sub(*args):
     """This is for either standard subtraction or unary minus."""
     if len(args) == 1: 
         return -args[0]()
-    first, others = args[0], args[1:]
-    return first() - _lazy_reduce(operator.add, others)
-
-def builtin_if(*args):
-    """Lazily interpret the arguments to implement if/elif/else.
-
-    (if test value
-     elif test value
-     else value)
+    return _lazy_reduce(operator.sub, args)
 
-    elif, else - These are just builtin symbols whose values are strings.
-    These keywords will only have special meaning in this function.  In fact,
-    the user could even just use string literals ;)
+def builtin_and(*args):
+    """Return the first argument that is false, or else the last one.
 
-    test - This may be anything that returns a value, including a function
-    call, of course.
+    Like Python's and, stop evaluating arguments as soon as one is false.
+    With no arguments, return 1.
 
-    value - This will be evaluated if the associated test is true or if it is
-    assoicated with an else.  It will be evaluated in a manner similar to the
-    body of a function (see Parameter.__call__).
+    """
+    value = 1
+    for i in args:
+        value = i()
+        if not value:
+            return value
+    return value
 
-    Here's an example:
+def builtin_or(*args):
+    """Return the first argument that is true, or else the last one.
 
-    (= wages
-      (if (is_hourly worker) (
-        (print "How much do you make per hour? ")
-        (float (raw_input))
-      ) else (
-        (print "How much do you make per year? ")
-        (float (raw_input))
-      ))
-    )
+    Like Python's or, stop evaluating arguments as soon as one is true.  With
+    no arguments, return 0.
 
     """
-    (test, value, args) = args[0], args[1], args[2:]
-    if test():
-        return value(implicitUnval=1, implicitLast=1)
-    while len(args):
-        (keyword, args) = args[0], args[1:]
-        if keyword() == "elif": 
-            (test, value, args) = args[0], args[1], args[2:]
-            if test():
-                return value(implicitUnval=1, implicitLast=1)
-        elif keyword() == "else":
-            if len(args) != 1: 
-                raise SyntaxError("unexpected values after else")
-            value = args[0]
-            return value(implicitUnval=1, implicitLast=1)
-        else:
-            raise SyntaxError("'%s' is neither elif or else" % keyword)
+    value = 0
+    for i in args:
+        value = i()
+        if value:
+            return value
+    return value
 
 def builtin_dict(*args):
     """Create a dict, and return it.
@@ -127,19 +108,107 @@ def builtin_dict(*args):
         dict[key()] = value()
     return dict
 
+def builtin_map(environ, f, *seqs):
+    """(map f seq...)
+
+    Like Python's map, but f may also be a user-defined function or a builtin.
+
+    """
+    return map(_get_python_function(environ, f()), 
+               *[i() for i in seqs])
+builtin_map.needsEnviron = 1
+
+def builtin_filter(environ, f, seq):
+    """(filter f seq)
+
+    Like Python's filter, but f may also be a user-defined function or a
+    builtin.
+
+    """
+    return filter(_get_python_function(environ, f()), seq())
+builtin_filter.needsEnviron = 1
+
+def builtin_reduce(environ, f, seq, *init):
+    """(reduce f seq [init])
+
+    Like Python's reduce, but f may also be a user-defined function or a
+    builtin.
+
+    """
+    return reduce(_get_python_function(environ, f()), seq(),
+                  *[i() for i in init])
+builtin_reduce.needsEnviron = 1
+
+def builtin_cons_stream(head, tail):
+    """(cons-stream head tail)
+
+    Return a Stream (see Stream.py).  head is evaluated now, but tail isn't
+    evaluated until it's needed.  tail should evaluate to a Stream, or to
+    None (e.g. ()), which is the empty stream.
+
+    """
+    return Stream(head(), tail)
+
+def builtin_head(s): return s().head
+def builtin_tail(s): return s().tail()
+def builtin_take(n, s): return take(n(), s())
+def builtin_stream(iterable): return from_iterator(iter(iterable()))
+
+def builtin_stream_map(environ, f, s):
+    """(stream-map f stream)
+
+    Return a Stream of f applied to each element of stream.  f is applied to
+    each element as it's needed, so stream may be infinite.
+
+    """
+    return stream_map(_get_python_function(environ, f()), s())
+builtin_stream_map.needsEnviron = 1
+
+def builtin_stream_filter(environ, f, s):
+    """(stream-filter f stream)
+
+    Return a Stream of the elements of stream for which f is true.  Like
+    stream-map, this only does as much work as is needed.
+
+    """
+    return stream_filter(_get_python_function(environ, f()), s())
+builtin_stream_filter.needsEnviron = 1
+
+def _get_python_function(environ, f):
+    """Return something that Python can call in place of f.
+
+    If f is a Python function, that's just f, so the loop runs entirely in
+    Python.  If it's lazy, return a function that applies it to already
+    evaluated arguments in environ.  Values that need no evaluating can be
+    passed to a lazy function as is (see interpreter._compile_argument).
+
+    """
+    if not hasattr(f, "lazy"):
+        return f
+    def apply(*args):
+        return f(environ, *args)
+    return apply
+
 def _lazy_reduce(f, list, init=None):
-    """Do a version of reduce that evaluates the members of list lazily.""" 
-    list_len = len(list)
-    if list_len == 0:
+    """Do a version of reduce that evaluates the members of list lazily.
+
+    Like reduce, this folds from the left, so (- 10 1 2) is (10 - 1) - 2.
+    Each member is evaluated just before it's needed.
+
+    """
+    if not len(list):
         if init:
             return init
         raise TypeError( "reduce() of empty sequence with no initial value")
-    first = list[0]()
-    if list_len == 1:
-        if init:
-            return f(first, init)
-        return first
-    return f(first, _lazy_reduce(f, list[1:], init))
+    if init:
+        value = init
+        start = 0
+    else:
+        value = list[0]()
+        start = 1
+    for i in range(start, len(list)):
+        value = f(value, list[i]())
+    return value
 
 def _lazy_map(f, list):
     """Do a version of map that evaluates the members of list lazily."""
@@ -160,6 +229,8 @@ builtins = {
     "%": builtin_mod,
     "and": builtin_and,
     "or": builtin_or,
+    "&": builtin_bitand,
+    "|": builtin_bitor,
     "xor": builtin_xor,
     "not": builtin_not,
     "~": builtin_inv,
@@ -167,7 +238,6 @@ builtins = {
     ">>": builtin_rshift,
     "'": builtin_unval,
     "print": builtin_print,
-    "if": builtin_if,
     "elif": "elif",
     "else": "else",
     "abs": builtin_abs,
@@ -179,7 +249,17 @@ builtins = {
     "del[]": builtin_delitem,
     "del[:]": builtin_delslice,
     "len": builtin_len,
-    "{}": builtin_dict
+    "{}": builtin_dict,
+    "map": builtin_map,
+    "filter": builtin_filter,
+    "reduce": builtin_reduce,
+    "cons-stream": builtin_cons_stream,
+    "head": builtin_head,
+    "tail": builtin_tail,
+    "take": builtin_take,
+    "stream": builtin_stream,
+    "stream-map": builtin_stream_map,
+    "stream-filter": builtin_stream_filter
 }
 
 
@@ -196,6 +276,9 @@ def _test_lazy_reduce():
     assert _lazy_reduce(operator.add, [_one], 1) == 2
     assert _lazy_reduce(operator.add, [_one] * 2) == 2
     assert _lazy_reduce(operator.add, [_one] * 10) == 10
+    assert _lazy_reduce(operator.add, [_one] * 10000) == 10000
+    assert _lazy_reduce(operator.sub, [_one, _one, _one]) == -1
+    assert _lazy_reduce(operator.add, [lambda: "a", lambda: "b"]) == "ab"
     
 def _test_lazy_map():    
     assert _lazy_map(_inc, [_one, _one]) == [2, 2]
@@ -204,30 +287,35 @@ def _test_sub():
     assert builtin_sub(_one) == -1
     assert builtin_sub(_one, _one, _one) == -1
     
-def _test_if():
+def _fail(): raise AssertionError("evaluated too many arguments")
+
+def _test_and_or():
+    assert builtin_and(_one, _zero, _fail) == 0
+    assert builtin_and(_one, _else) == "else"
+    assert builtin_and() == 1
+    assert builtin_or(_zero, _elif, _fail) == "elif"
+    assert builtin_or(_zero, _zero) == 0
+    assert builtin_or() == 0
+    assert builtin_bitand(lambda: 6, lambda: 3) == 2
+    assert builtin_bitor(lambda: 6, lambda: 3) == 7
+
+def _test_sequences():
     from Environ import Environ # Circular dependency.
+    from function import create_function # Circular dependency.
     environ = Environ()
-    p = lambda parseTree, environ = environ: Parameter(
-        value = Expression(environ = environ, parseTree = parseTree))
-    _two = p(2)
-    _one_two_list = p([1, 2])
-    _bad = p(Symbol(name = "undefined"))
-    tests = [
-        ([_one, _two], 2),
-        ([_one, _one_two_list], 2),
-        ([_zero, _bad, _elif, _one, _two], 2),
-        ([_zero, _bad, _elif, _zero, _bad, _elif, _one, _two], 2),
-        ([_zero, _bad, _else, _two], 2)
-    ]
-    for i in tests:
-        (args, value) = i
-        try:
-            returned = builtin_if(*args)
-            assert value == returned
-        except AssertionError, e:
-            sys.stderr.write("squeamish: test failed: %s led to %s\n" % (
-                `i`, returned))
-            raise AssertionError
+    double = create_function("double", ["n"], 
+        [lambda environ: environ["n"] * 2])
+    _double = lambda: double
+    _list = lambda: [1, 2, 3]
+    assert builtin_map(environ, _double, _list) == [2, 4, 6]
+    assert builtin_map(environ, lambda: str, _list) == ["1", "2", "3"]
+    assert builtin_map(environ, lambda: environ["+"], _list, _list) == [
+        2, 4, 6]
+    odd = create_function("odd", ["n"], [lambda environ: environ["n"] % 2])
+    assert builtin_filter(environ, lambda: odd, _list) == [1, 3]
+    assert builtin_reduce(environ, lambda: environ["*"], _list) == 6
+    assert builtin_reduce(environ, lambda: environ["+"], _list, _one) == 7
+    assert builtin_map(environ, _double, lambda: range(100000))[-1] == 199998
 
 def _test_builtin_dict():
     assert builtin_dict(_elif, _zero, _else, _one) == {"elif": 0, "else": 1}
@@ -238,5 +326,6 @@ if __name__ == '__main__':
     _test_lazy_map()
     _test_lazy_reduce()
     _test_sub()
-    _test_if()
+    _test_and_or()
+    _test_sequences()
     _test_builtin_dict()
@@ -1,18 +1,46 @@
 """This file contains the Environ class."""
 
-from UserDict import UserDict
+import __builtin__
 import re
+import types
 
 from Expression import Expression
 from builtin_function import create_builtin_function
 from builtins import builtins
 
 
-class Environ(UserDict):
+# This marks a slot whose parameter has been deleted (see Environ.del_local).
+unbound = []
+
+# This is the Environ containing the builtins.  See get_builtins_environ.
+_builtinsEnviron = None
+
+
+def get_builtins_environ():
+    """Return the Environ containing the builtins.
+
+    It's created the first time it's needed, and then it's shared by every
+    Environ hierarchy.  Hence, it's read-only.  Builtins may still be
+    shadowed, since new bindings are made in the child Environ's.
+
+    """
+    global _builtinsEnviron
+    if _builtinsEnviron is None:
+        environ = Environ(parent = None)
+        for (key, val) in builtins.items():
+            if callable(val):
+                val = create_builtin_function(key, val)
+            environ[key] = val
+        environ.readOnly = 1
+        _builtinsEnviron = environ
+    return _builtinsEnviron
+
+
+class Environ(object):
 
     """This is the environment (i.e. symbol table).
 
-    This class is just a dict with a few additions:
+    This class is a lot like a dict, with a few additions:
 
     1) It implicitly supports nesting in order to implement nested scopes.
        This is based on the chain of responsibility design pattern.
@@ -20,7 +48,17 @@ class Environ(UserDict):
     2) While looking for a key, if the key isn't found in any of the parents,
        the Python environment is searched next.  
 
-    3) In order to implement lazy evaluation of function parameters for 
+    3) Since scoping is dynamic, the parent of a function's Environ is the
+       caller's Environ, so the chain of Environ's is as long as the call
+       stack is deep.  To keep lookups from having to walk the whole chain
+       each time, each Environ caches which Environ in the chain a name was
+       found in (see _find).  A name's cache entries are invalidated by
+       bumping its version in Environ.versions whenever a binding for it is
+       added to an Environ that may be part of someone else's chain, or
+       whenever a binding for it is deleted.  Binding one name doesn't
+       invalidate the entries for any other name.
+
+    4) In order to implement lazy evaluation of function parameters for 
        user-defined functions (see also Parameter.py), the value associated
        with a function parameter will be an Expression instance.  When a lookup
        is done on the function parameter, the Expression will be evaluated
@@ -29,46 +67,97 @@ class Environ(UserDict):
        evaluation only happens once, in case there are side effects) and
        returned.
 
-    The keys used in this dict are strings (there's no need to 
-    encapsulate the strings in Symbol instances since there can be no 
-    confusion been a normal string and a Symbol, like in a parse tree).  The
-    values will be normal values such as ints, floats, user-defined functions,
-    etc.
+    5) The parameters of a user-defined function are kept in a list of
+       slots, rather than in a dict.  Which slot each parameter goes in is
+       worked out when the function is defined (see function.get_slots), so
+       the function's body can be compiled to access its parameters by
+       index (see interpreter.compile_tree).  Other bindings (e.g. those made
+       by "=") are kept in a dict, which is only created when it's needed.
+
+    The keys used are strings (there's no need to encapsulate the strings in
+    Symbol instances since there can be no confusion been a normal string and
+    a Symbol, like in a parse tree).  The values will be normal values such as
+    ints, floats, user-defined functions, etc.
     
     The following attributes are used:
 
     parent - This is the parent Environ.  
 
-    pythonGlobals - This will be passed to eval anytime it is used.  Sometimes
-    it is necessary to put stuff in the global Python namespace, which is 
-    challenging in Jython.  There is only one copy of this dict per nested
-    Environ hierarchy.
+    names - This maps parameter names to slot indexes.  It's shared by every
+    Environ created for the same function.
+
+    slots - This is a list of parameter values, or unbound.
+
+    data - This is a dict of the other bindings, or None.
+
+    pythonGlobals - This is the namespace that Python names are looked up in
+    (before looking in __builtin__).  Sometimes it is necessary to put stuff
+    in the global Python namespace, which is challenging in Jython.  There is
+    only one copy of this dict per nested Environ hierarchy.  The children of
+    a read-only Environ each start a new hierarchy.
+
+    pythonCache - This maps Python names to (value, pythonVersion) pairs.
+    It's shared the same way pythonGlobals is.  See _find_python.
+
+    readOnly - If this is true, bindings can't be added, changed, or deleted.
+
+    retired - This is true once the function that this Environ was created
+    for has finished (see retire).
+
+    hasChildren - Has this Environ ever been used as a parent?
+
+    writers - This is the number of Expression's tied to this Environ that
+    haven't been evaluated yet and that may bind names in it (see
+    interpreter._compile_argument).  See retire.
+
+    cache - This maps names to (owner, version) pairs, or it's None.  See
+    _find.
 
     """
 
-    def __init__(self, parent = builtins, *args, **kargs):
-        """Extend the base class constructor to accept parent.
+    __slots__ = ["parent", "names", "slots", "data", "pythonGlobals",
+                 "pythonCache", "readOnly", "retired", "hasChildren", "writers",
+                 "cache"]
+
+    # This maps each name to a version that's bumped whenever the Environ
+    # the name resolves to might have changed.  Names that aren't in it are at
+    # version 0.  See _find.
+    versions = {}
+
+    # This is bumped whenever what a Python name resolves to might have 
+    # changed (e.g. by pyimport or ".=").  See _find_python.
+    pythonVersion = 0
+
+    def __init__(self, parent = builtins, names = {}, slots = ()):
+        """Initialize the Environ.
         
-        parent - By default, parent is set to a new Environ containing the 
-        builtins (which will be properly wrapped using 
-        create_builtin_function).  If you do not wish to have a parent, pass
-        None.  Otherwise, pass an existing parent.
+        parent - By default, parent is set to the shared Environ containing
+        the builtins (see get_builtins_environ).  If you do not wish to have a
+        parent, pass None.  Otherwise, pass an existing parent.
 
-        args, kargs - These are passed to UserDict.__init__.
+        names, slots - These are used for the parameters of user-defined
+        functions.  names isn't modified, so it may be shared.
         
         """
-        UserDict.__init__(self, *args, **kargs)
-        if parent == builtins:
-            parent = Environ(parent = None)
-            for (key, val) in builtins.items():
-                if callable(val):
-                    val = create_builtin_function(key, val)
-                parent[key] = val
+        if parent is builtins:
+            parent = get_builtins_environ()
         self.parent = parent
-        if self.parent:
-            self.pythonGlobals = self.parent.pythonGlobals
+        self.names = names
+        self.slots = slots
+        self.data = None
+        self.readOnly = 0
+        self.retired = 0
+        self.hasChildren = 0
+        self.writers = 0
+        self.cache = None
+        if parent is not None:
+            parent.hasChildren = 1
+        if parent is not None and not parent.readOnly:
+            self.pythonGlobals = parent.pythonGlobals
+            self.pythonCache = parent.pythonCache
         else:
             self.pythonGlobals = {}
+            self.pythonCache = {}
 
     def __getitem__(self, s):
         """Look up the value of a string.
@@ -77,22 +166,150 @@ class Environ(UserDict):
         o If the value is an Expression, evaluate it (in its own Environ), 
           cache the value, and return it.  
         o Searches into the Python namespace will only be done for valid
-          identifiers.  self.pythonGlobals will be passed to eval.
+          identifiers, which may be dotted.  See _find_python.
         o Complete failures will result in a NameError.
         
         """
-        from interpreter import evaluate # Circular dependency.
-        if self.data.has_key(s):
-            val = self.data[s]
+        index = self.names.get(s) # This is _get_local, inlined for speed.
+        if index is not None and self.slots[index] is not unbound:
+            val = self.slots[index]
             if isinstance(val, Expression):
-                val = evaluate(val.parseTree, val.environ)
-                self.data[s] = val
+                val = val.evaluate()
+                self.slots[index] = val
             return val
-        if self.parent != None: # For some reason, "!= None" is necessary.
-            return self.parent[s]
-        if re.match(r'^[\w\.]+$', s):
-            return eval(s, self.pythonGlobals)
-        raise NameError("name '%s' is not defined" % s)
+        if self.data is not None and self.data.has_key(s):
+            owner = self
+        else:
+            owner = self._find(s)
+        if owner is not None:
+            return owner._get_local(s)
+        return self._find_python(s)
+
+    def __setitem__(self, key, val):
+        """Bind key to val.
+
+        Adding a new binding to an Environ that has children may change what
+        the key resolves to in those children, so invalidate the caches for
+        the key.
+
+        """
+        if self.readOnly:
+            raise TypeError("can't modify a read-only Environ")
+        if self.hasChildren and not self.has_local(key):
+            versions = Environ.versions
+            versions[key] = versions.get(key, 0) + 1
+        self._set_local(key, val)
+
+    def has_local(self, key):
+        """Is key bound in this Environ (as opposed to a parent)?"""
+        index = self.names.get(key)
+        if index is not None:
+            return self.slots[index] is not unbound
+        return self.data is not None and self.data.has_key(key)
+
+    def _get_local(self, key):
+        """Return the value of key, which must be bound in this Environ."""
+        index = self.names.get(key)
+        if index is not None:
+            val = self.slots[index]
+            if isinstance(val, Expression):
+                val = val.evaluate()
+                self.slots[index] = val
+        else:
+            val = self.data[key]
+            if isinstance(val, Expression):
+                val = val.evaluate()
+                self.data[key] = val
+        return val
+
+    def _set_local(self, key, val):
+        """Bind key to val in this Environ without invalidating any caches."""
+        index = self.names.get(key)
+        if index is not None:
+            self.slots[index] = val
+        else:
+            if self.data is None:
+                self.data = {}
+            self.data[key] = val
+
+    def _items(self):
+        """Return a list of (key, val) pairs bound in this Environ."""
+        items = [(key, self.slots[index]) 
+                 for (key, index) in self.names.items()
+                 if self.slots[index] is not unbound]
+        if self.data is not None:
+            items.extend(self.data.items())
+        return items
+
+    def _find(self, s):
+        """Return the Environ in the parent chain that has s, or None.
+
+        While walking up the chain, stop at the first Environ that has a
+        valid cache entry for s.  The answer is then cached in each Environ
+        that was walked through, since none of them has s either.  Hence, in
+        a recursive function, a lookup takes constant time (amortized) no
+        matter how deep the recursion is, even if the callers haven't looked
+        s up yet.
+
+        """
+        version = Environ.versions.get(s, 0)
+        environ = self
+        walked = []
+        while 1:
+            if environ.cache is not None:
+                entry = environ.cache.get(s)
+                if entry is not None and entry[1] == version:
+                    owner = entry[0]
+                    break
+            walked.append(environ)
+            environ = environ.parent
+            if environ is None:
+                owner = None
+                break
+            if environ.has_local(s):
+                owner = environ
+                break
+        entry = (owner, version)
+        for environ in walked:
+            if environ.cache is None:
+                environ.cache = {}
+            environ.cache[s] = entry
+        return owner
+
+    def _find_python(self, s):
+        """Look up the value of a (possibly dotted) Python name.
+
+        This does what eval(s, self.pythonGlobals) would do for a name such
+        as "time.time", but without compiling anything.  The first part of
+        the name is looked up in self.pythonGlobals and then in __builtin__.
+        The rest are looked up as attributes.
+
+        Modules, classes, and functions are cached in self.pythonCache, until
+        Environ.pythonVersion changes.  Other values (such as sys.stdout) are
+        looked up every time, since they're more likely to change.
+
+        """
+        entry = self.pythonCache.get(s)
+        if entry is not None and entry[1] == Environ.pythonVersion:
+            return entry[0]
+        if not re.match(r'^[\w\.]+$', s):
+            raise NameError("name '%s' is not defined" % s)
+        parts = s.split(".")
+        for i in parts:
+            if not i or i[0].isdigit():
+                raise SyntaxError("invalid syntax")
+        first = parts[0]
+        if self.pythonGlobals.has_key(first):
+            val = self.pythonGlobals[first]
+        elif hasattr(__builtin__, first):
+            val = getattr(__builtin__, first)
+        else:
+            raise NameError("name '%s' is not defined" % first)
+        for i in parts[1:]:
+            val = getattr(val, i)
+        if callable(val) or isinstance(val, types.ModuleType):
+            self.pythonCache[s] = (val, Environ.pythonVersion)
+        return val
 
     def has_key(self, key):
         """Do we have the given key?"""
@@ -102,6 +319,30 @@ class Environ(UserDict):
         except NameError:
             return 0
 
+    def retire(self):
+        """Note that the function this Environ was created for has finished.
+
+        This is called when that function returns or makes a tail call (see
+        function.create_function).  The Environ may still be used by
+        Expression's that were tied to it, so its bindings must stay visible.
+        However, a retired parent can be skipped over by copying its
+        bindings into this Environ.  That way, a chain of tail calls doesn't
+        build up an equally long chain of Environ's.
+
+        The copies would go stale if the parent's bindings could still
+        change.  Once its function has finished, only the Expression's tied
+        to it can run code in it, so a parent with writers is left in place.
+
+        """
+        parent = self.parent
+        while parent is not None and parent.retired and not parent.writers:
+            for (key, val) in parent._items():
+                if not self.has_local(key):
+                    self._set_local(key, val)
+            parent = parent.parent
+        self.parent = parent
+        self.retired = 1
+
     def del_local(self, key):
         """Delete key from self.
 
@@ -109,10 +350,17 @@ class Environ(UserDict):
         Environ's.  Instead, raise a NameError.
 
         """
-        if self.data.has_key(key):
-            del self.data[key]
-        else:
+        if not self.has_local(key):
             raise NameError("name '%s' is not defined" % key)
+        if self.readOnly:
+            raise TypeError("can't modify a read-only Environ")
+        index = self.names.get(key)
+        if index is not None:
+            self.slots[index] = unbound
+        else:
+            del self.data[key]
+        versions = Environ.versions
+        versions[key] = versions.get(key, 0) + 1
 
 
 # Do some testing.
@@ -121,8 +369,25 @@ if __name__ == '__main__':
     assert not globals.has_key("+")
     assert globals.has_key("int")
     globals = Environ()
-    assert globals.pythonGlobals == globals.parent.pythonGlobals
+    assert globals.parent is get_builtins_environ()
+    assert globals.parent is Environ().parent
+    assert globals.pythonGlobals is not Environ().pythonGlobals
     assert globals.has_key("+")
+    try:
+        globals.parent["+"] = None
+        raise AssertionError("expected a TypeError")
+    except TypeError:
+        pass
+    assert globals["int"] is int
+    assert globals.pythonCache.has_key("int")
+    assert not globals.has_key("re.match")
+    globals.pythonGlobals["re"] = re
+    assert globals["re.match"] is re.match
+    assert globals.pythonCache.has_key("re.match")
+    globals["+"] = "plus"
+    assert globals["+"] == "plus"
+    assert Environ()["+"] != "plus"
+    globals.del_local("+")
     globals["foo"] = "bar"
     locals = Environ(globals)
     assert locals.has_key("foo")
@@ -132,3 +397,43 @@ if __name__ == '__main__':
     assert globals["foo"] == "bar"
     locals.del_local("foo")
     assert globals["foo"] == "bar"
+    caller = Environ(globals)
+    caller["foo"] = "spam"
+    caller.retire()
+    callee = Environ(caller)
+    callee.retire()
+    assert callee.parent is globals
+    assert callee["foo"] == "spam"
+    caller = Environ(globals)
+    caller.writers = 1
+    caller.retire()
+    callee = Environ(caller)
+    callee.retire()
+    assert callee.parent is caller
+    for i in range(100):
+        locals = Environ(locals)
+    assert locals["foo"] == "bar"
+    assert locals.cache["foo"][0] is globals
+    assert locals.parent["foo"] == "bar"
+    assert locals.parent.cache["foo"][0] is globals
+    globals["foo"] = "spam"
+    assert locals["foo"] == "spam"
+    locals.parent["foo"] = "eggs"
+    assert locals["foo"] == "eggs"
+    locals.parent.del_local("foo")
+    assert locals["foo"] == "spam"
+    entry = locals.cache["foo"]
+    locals.parent["bar"] = "ham"
+    assert locals.cache["foo"] is entry
+    assert locals["foo"] == "spam"
+    assert locals.cache["foo"] is entry
+    locals = Environ(globals, {"foo": 0, "bar": 1}, ["spam", "eggs"])
+    assert locals["foo"] == "spam"
+    assert locals["bar"] == "eggs"
+    locals["foo"] = "ham"
+    assert locals.slots == ["ham", "eggs"]
+    assert locals.data == None
+    locals.del_local("foo")
+    assert locals["foo"] == "spam"
+    locals["foo"] = "ham"
+    assert locals["foo"] == "ham"
@@ -1,9 +1,13 @@
 """This file contains the Expression class."""
 
-from AutomaticClass import AutomaticClass
+from AutomaticClass import SlottedClass
 
 
-class Expression(AutomaticClass):
+# This is the default for Expression's value argument, meaning "not given".
+_unevaluated = []
+
+
+class Expression(SlottedClass):
     
     """This encapsulates a non-evaluated value (e.g. a function call).
     
@@ -14,12 +18,51 @@ class Expression(AutomaticClass):
     
     parseTree - This is the expression.
 
+    code - This is parseTree, compiled (see interpreter.compile_tree).  If
+    it isn't given, it'll be compiled when it's first needed.
+
+    value - This is the result of evaluate, once it has been called.  If it
+    is given to the constructor, the expression is already evaluated.
+
     """
 
-    def getAttributes(self):
-        return AutomaticClass.getAttributes(self) + ["environ", "parseTree"]
+    __slots__ = ["environ", "parseTree", "code", "value"]
+
+    def __init__(self, environ = None, parseTree = None, code = None, 
+                 value = _unevaluated):
+        self.environ = environ
+        self.parseTree = parseTree
+        self.code = code
+        if value is not _unevaluated:
+            self.value = value
+
+    def evaluate(self):
+        """Evaluate the expression in its environ, and return the result.
+
+        The result is cached, so the expression is only evaluated once, even
+        if it's bound in more than one Environ.  After that, the environ is
+        dropped so that it can be garbage collected.
+
+        """
+        if not hasattr(self, "value"):
+            if self.code is None:
+                from interpreter import compile_tree # Circular dependency.
+                self.code = compile_tree(self.parseTree)
+            self.value = self.code(self.environ)
+            self.environ = None
+        return self.value
 
 
 # Do some testing.
 if __name__ == '__main__':
     Expression(environ = None, parseTree = [])
+    e = Expression(environ = None, parseTree = "foo")
+    assert e.evaluate() == "foo"
+    assert e.evaluate() == "foo"
+    assert e.environ == None
+    e = Expression(environ = None, parseTree = "foo", value = "bar")
+    assert e.evaluate() == "bar"
+    e = Expression(environ = None, parseTree = [])
+    assert e.evaluate() == None
+    e.code = None
+    assert `e` == "<Expression environ=None parseTree=[] code=None value=None>"
@@ -2,6 +2,7 @@
 
 from __future__ import nested_scopes 
 
+from Expression import Expression
 from Symbol import Symbol
 
 
@@ -20,12 +21,16 @@ def create_external_function(name, function):
     def closure(environ, *args):
         """Apply the function to args, and return the results.
 
-        Because Python does not support lazy evaluation, the args must be 
-        evaluated before passing them to the function.
+        Because Python does not support lazy evaluation, the args (which are
+        Expression's) must be evaluated before passing them to the function.
+        Arguments that are already evaluated are passed as is.
 
         """
-        from interpreter import evaluate # Circular dependency.
-        parameters = [evaluate(i, environ) for i in args]
+        parameters = []
+        for i in args:
+            if isinstance(i, Expression):
+                i = i.evaluate()
+            parameters.append(i)
         return function(*parameters)
 
     return closure
@@ -39,3 +44,9 @@ if __name__ == '__main__':
     str_ = Symbol(name = "str")
     assert evaluate([str_, 1], locals) == "1"
     assert not hasattr(locals["str"], "lazy")
+    l = []
+    append = create_external_function("append", l.append)
+    append(locals, Expression(environ = locals, parseTree = 1))
+    assert l == [1]
+    append(locals, 2)
+    assert l == [1, 2]
@@ -6,50 +6,232 @@ from Symbol import Symbol
 from Expression import Expression
 
 
+# This is the default maxSize of a memoized function.  See
+# create_memo_function.
+MEMO_SIZE = 1000
+
+
+class TailCall:
+
+    """This is a call to a user-defined function that hasn't happened yet.
+
+    Code in tail position (see interpreter.compile_tree) returns one of these
+    instead of calling a user-defined function.  The function that was
+    running when the TailCall was returned has nothing left to do, so its
+    caller makes the call instead (see create_function).  Hence, a chain of
+    tail calls runs in a loop, rather than on the Python stack.
+
+    The following attributes are used:
+
+    apply - This is the "apply" attribute of the user-defined function.
+    environ - This is the caller's Environ.
+    args - This is a list of Expression's (or already evaluated values).
+
+    """
+
+    def __init__(self, apply, environ, args):
+        self.apply = apply
+        self.environ = environ
+        self.args = args
+
+
+def get_slots(parameters):
+    """Return a dict mapping each parameter name to its slot index.
+
+    See Environ.  If a name is repeated, the last one wins.
+
+    parameters - This is a list of strings.
+
+    """
+    slots = {}
+    for i in range(0, len(parameters)):
+        slots[parameters[i]] = i
+    return slots
+
 def create_function(name, parameters, body):
 
     """Return a user-defined function.
     
     This function creates a closure for the returned function.  The returned 
-    function will have the "lazy" attribute set to 1.
+    function will have the "lazy" attribute set to 1.  It will also have an
+    "apply" attribute, which is like the function itself except that it takes
+    args as a list and that it may return a TailCall.
 
     name - This is a string.
 
     parameters - This is a list of strings.
 
-    body - This is a parse tree.
+    body - This is a list of compiled statements (see
+    interpreter.compile_tree).  The statements should have been compiled
+    with get_slots(parameters) as their scope, and the last statement should
+    have been compiled in tail position.
     
     """
 
-    def closure(environ, *args):
+    names = get_slots(parameters)
+
+    def apply(environ, args):
         """Apply the function to args, and return the results.
         
         Note, the function application should take place in a newly nested 
-        Environ.  In this newly nested Environ, tie the formal arguments to
-        the parameters using Expression's in order to implement lazy
-        evaluation.  On the other hand, the parameter Expression's should be
-        evaluated in the caller's Environ (i.e. (sum a b) should evaluate a and
-        b in the caller's Environ, not sum's Environ).
+        Environ.  In this newly nested Environ, put the arguments in the
+        parameters' slots in order to implement lazy evaluation.  Each argument
+        is an Expression that the caller has already tied to its own Environ
+        (i.e. (sum a b) should evaluate a and b in the caller's Environ, not
+        sum's Environ), or a value that needed no evaluating, such as a 
+        literal.
         
-        Return the last executed "statement" of the function.
+        Return the last executed "statement" of the function, which may be a
+        TailCall.  Otherwise, the function is finished, so its Environ is
+        retired (see Environ.retire).  Expression's tied to it (e.g. the
+        tail of a stream) may still be evaluated later, and any function
+        they call gets it as a parent.  Retiring it lets that function's
+        Environ skip over it, so a stream that's built by a recursive
+        function doesn't keep a chain of Environ's alive.
 
         """
         from Environ import Environ # Circular dependency.
-        from interpreter import evaluate # Circular dependency.
         if not len(parameters) == len(args):
             raise TypeError("%s() takes exactly %d arguments (%d given)" % 
                 (name, len(parameters), len(args)))
-        locals = Environ(parent = environ)
-        for i in range(0, len(parameters)): 
-            locals[parameters[i]] = Expression(environ = environ,
-                parseTree = args[i])
+        locals = Environ(environ, names, list(args))
         for i in body:
-            ret = evaluate(i, locals)
+            ret = i(locals)
+        if not isinstance(ret, TailCall):
+            locals.retire()
+        return ret
+
+    def closure(environ, *args):
+        """Apply the function to args, and return the results.
+
+        Keep making tail calls until there are none left.  Since the function
+        that returned a TailCall is finished, its Environ is retired before
+        making the call (see Environ.retire).  This way, neither the Python
+        stack nor the chain of Environ's grows with each tail call.
+
+        """
+        ret = apply(environ, args)
+        while isinstance(ret, TailCall):
+            ret.environ.retire()
+            ret = ret.apply(ret.environ, ret.args)
         return ret
 
     closure.lazy = 1
+    closure.apply = apply
     return closure
 
+def create_memo_function(name, parameters, body):
+
+    """Return a memoized user-defined function.
+
+    This is like create_function, but the returned function remembers the
+    results of its most recent calls, and when it's called again with the 
+    same arguments, it just returns the remembered result.  In order to
+    compare arguments, it has to evaluate all of them before it's called, so
+    its arguments aren't lazy.  Nor are calls to it tail calls (it has no
+    "apply" attribute).
+
+    If any of the arguments can't be hashed (e.g. a list or a dict), the
+    call isn't memoized.  The function is just called, and neither hits nor
+    misses is changed.
+
+    The returned function has the following attributes, which the program
+    may look at (see python_constructs._compile_attr):
+
+    hits, misses - These count the calls that were and weren't answered from
+    the cache.
+
+    maxSize - This is the number of results to remember.  When there are
+    more, the least recently used is forgotten.  It's MEMO_SIZE by default,
+    and it may be changed at any time.  If it's None, there's no limit.
+
+    """
+
+    function = create_function(name, parameters, body)
+    cache = _LRUCache()
+
+    def closure(environ, *args):
+        """Evaluate args, and return the remembered result, if any.
+
+        Otherwise, call the function and remember the result.
+
+        """
+        values = []
+        for i in args:
+            if isinstance(i, Expression):
+                i = i.evaluate()
+            values.append(i)
+        key = tuple(values)
+        try:
+            hash(key)
+        except TypeError:
+            return function(environ, *values)
+        if cache.has_key(key):
+            closure.hits += 1
+            return cache.get(key)
+        closure.misses += 1
+        ret = function(environ, *values)
+        cache.set(key, ret, closure.maxSize)
+        return ret
+
+    closure.lazy = 1
+    closure.hits = 0
+    closure.misses = 0
+    closure.maxSize = MEMO_SIZE
+    return closure
+
+
+class _LRUCache:
+
+    """This is a dict that forgets the least recently used keys.
+
+    The entries are kept in a circular, doubly-linked list, in order of use,
+    so that each operation takes constant time.  Each link is a list of
+    [previous, next, key, value].
+
+    The following attributes are used:
+
+    links - This maps each key to its link.
+    root - This is the sentinel link.  root[1] is the least recently used
+    entry, and root[0] is the most recently used.
+
+    """
+
+    def __init__(self):
+        self.links = {}
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+
+    def has_key(self, key):
+        return self.links.has_key(key)
+
+    def get(self, key):
+        """Return the value of key, and mark it as the most recently used."""
+        link = self.links[key]
+        self._unlink(link)
+        self._append(link)
+        return link[3]
+
+    def set(self, key, value, maxSize):
+        """Set key to value, and forget entries until there are maxSize."""
+        if self.links.has_key(key):
+            self._unlink(self.links[key])
+        link = [None, None, key, value]
+        self.links[key] = link
+        self._append(link)
+        while maxSize is not None and len(self.links) > maxSize:
+            oldest = self.root[1]
+            self._unlink(oldest)
+            del self.links[oldest[2]]
+
+    def _unlink(self, link):
+        link[0][1], link[1][0] = link[1], link[0]
+
+    def _append(self, link):
+        last = self.root[0]
+        link[0], link[1] = last, self.root
+        last[1] = self.root[0] = link
+
 
 # Do some testing.
 if __name__ == '__main__':
@@ -67,3 +249,20 @@ if __name__ == '__main__':
     assert evaluate([foo, "spam", [div_, 1, 0]], locals) == "spam"
     assert evaluate([f, "spam", [div_, 1, 0]], locals) == "spam"
     assert not locals.has_key(arg1.name)
+    countdown = Symbol(name = "countdown")
+    n = Symbol(name = "n")
+    if_ = Symbol(name = "if")
+    minus = Symbol(name = "-")
+    evaluate([def_, countdown, [n], 
+        [if_, n, [[countdown, [minus, n, 1]]], Symbol(name = "else"), 
+            ["done"]]], locals)
+    assert evaluate([countdown, 5000], locals) == "done"
+    cache = _LRUCache()
+    for i in range(3):
+        cache.set(i, i * 10, 2)
+    assert not cache.has_key(0)
+    assert cache.get(1) == 10
+    cache.set(3, 30, 2)
+    assert cache.has_key(1) and not cache.has_key(2) and cache.has_key(3)
+    cache.set(1, 11, 0)
+    assert not cache.links
@@ -1,47 +1,209 @@
-"""This file contains the interpreter."""
+"""This file contains the interpreter.
 
+Parse trees are not walked directly.  Instead, compile_tree turns a parse tree
+into a tree of closures, once, and it's those closures that do the work.  Each
+closure takes an Environ and returns a value:
+
+    code = compile_tree(parse("(+ 1 2)"))
+    code(environ)
+
+Hence, everything that would otherwise be decided each time a node is
+evaluated (Is it a literal?  Is it a construct?  Which one?) is decided once,
+at compile time.  User-defined functions compile their bodies when they are
+defined, so calling them never has to look at the parse tree again.
+
+Code can be compiled in "tail position", which means that its value will be
+returned, as is, by the user-defined function it's in.  A call to a
+user-defined function in tail position doesn't actually call the function.
+Instead, it returns a TailCall, and the caller makes the call (see
+function.create_function).  This lets recursive loops (such as a server's
+main loop) run forever.  The last statement of a def is in tail position,
+as is the last statement of the value of an if that is itself in tail
+position.
+
+Code can also be compiled within the "scope" of a def.  The scope maps the
+names of the function's parameters to their slots in the function's Environ
+(see function.get_slots), and code compiled within it accesses those
+parameters by index instead of by name.
+
+"""
+
+import operator
 import sys
 
-from parser import yacc
+from reader import parse
 from python_constructs import get_python_constructs
 from Symbol import Symbol
-from function import create_function
-from external_function import create_external_function
+from Expression import Expression
+from function import create_function, create_memo_function, get_slots, \
+    TailCall
+from Environ import unbound, get_builtins_environ
+
+
+# This caches compiled code for the parse trees given to evaluate.  It maps
+# id(tree) to (tree, code).  Keeping a reference to the tree insures that the
+# id isn't reused while the entry exists.
+_evaluate_cache = {}
+_EVALUATE_CACHE_SIZE = 1000
+
+# This maps (name, number of arguments) for each builtin that just applies an
+# operator to its evaluated arguments to that operator.  See
+# _compile_operator.
+_operators = {
+    ("==", 2): operator.eq,
+    ("!=", 2): operator.ne,
+    (">=", 2): operator.ge,
+    ("<=", 2): operator.le,
+    (">", 2): operator.gt,
+    ("<", 2): operator.lt,
+    ("+", 2): operator.add,
+    ("-", 1): operator.neg,
+    ("-", 2): operator.sub,
+    ("*", 2): operator.mul,
+    ("/", 2): operator.div,
+    ("truediv", 2): operator.truediv,
+    ("%", 2): operator.mod,
+    ("xor", 2): operator.xor,
+    ("not", 1): operator.not_,
+    ("~", 1): operator.inv,
+    ("<<", 2): operator.lshift,
+    (">>", 2): operator.rshift,
+    ("abs", 1): abs
+}
 
 
 def evaluate(value, environ):
     """Evaluate value in the given environ.
-    
-    Return the following:
+
+    This is a compatibility wrapper around compile_tree.  Compiled lists are
+    cached, so evaluating the same parse tree repeatedly only compiles it
+    once.  See compile_tree for the rules of evaluation.
+
+    """
+    if isinstance(value, type([])):
+        entry = _evaluate_cache.get(id(value))
+        if entry is None:
+            if len(_evaluate_cache) >= _EVALUATE_CACHE_SIZE:
+                _evaluate_cache.clear()
+            entry = (value, compile_tree(value))
+            _evaluate_cache[id(value)] = entry
+        return entry[1](environ)
+    return compile_tree(value)(environ)
+
+def compile_tree(value, tail=0, scope=None):
+    """Compile value, and return a closure that evaluates it.
+
+    The returned closure takes an Environ and returns the following:
 
     Given an int, float, string, or something callable, just return it.
     Given a symbol, do a lookup, and return the result.
     Given a list:
         Given an empty list, return None.
-        Given a supported construct, call the associated handler.
-        Otherwise, treat the list as a function call.  Return the value of
-            _evaluate_call.
+        Given a supported construct, use the code compiled by the associated
+            handler.
+        Otherwise, treat the list as a function call.  See _compile_call.
     Otherwise, raise a SyntaxError.
 
+    tail - Is value in tail position?  If so, the closure may return a
+    TailCall.
+
+    scope - If value is part of the body of a def, this is a dict mapping
+    the def's parameter names to slot indexes.  The closure must then only
+    be called with an Environ created for that function.
+
+    Syntax errors are not raised at compile time.  Instead, the returned
+    closure raises them when (and if) it is evaluated, just as if the tree had
+    been interpreted directly.
+
     """
-    if (isinstance(value, type(0)) or 
-        isinstance(value, type(0.0)) or
-        isinstance(value, type("")) or
-        callable(value)):
-        return value
+    try:
+        return _compile(value, tail, scope)
+    except SyntaxError, e:
+        return _compile_error(e)
+
+def compile_body(value, tail=0, scope=None):
+    """Compile value as a body, and return a closure that evaluates it.
+
+    A body is a list of statements, such as the value of an if.  The returned
+    closure evaluates each statement in order and returns the value of the
+    last one (or None if there aren't any).  Unlike compile_tree, the list
+    itself is not treated as a function call.  tail and scope are as for
+    compile_tree; if tail is true, the last statement is in tail position.
+
+    """
+    if value == []:
+        return _compile_literal(None)
+    statements = ([compile_tree(i, scope = scope) for i in value[:-1]] + 
+                  [compile_tree(value[-1], tail = tail, scope = scope)])
+    if len(statements) == 1:
+        return statements[0]
+    def code(environ):
+        for i in statements:
+            ret = i(environ)
+        return ret
+    return code
+
+def _compile(value, tail, scope):
+    """Do the work for compile_tree, but let SyntaxError's escape."""
+    if _is_literal(value):
+        return _compile_literal(value)
     if isinstance(value, Symbol):
-        return environ[value.name]
+        return _compile_symbol(value, scope)
     if isinstance(value, type([])):
         if value == []:
-            return None
+            return _compile_literal(None)
         if isinstance(value[0], Symbol):
-            name = value[0].name
-            if constructs.has_key(name):
-                return constructs[name](value, environ)
-        return _evaluate_call(value, environ)
+            if tail and value[0] is _if:
+                return _compile_if(value, scope, tail)
+            handler = constructs.get(value[0])
+            if handler:
+                return handler(value, scope)
+        return _compile_call(value, scope, tail)
     raise SyntaxError("invalid syntax")
 
-def _evaluate_assignment(value, environ):
+def _is_literal(value):
+    """Does value evaluate to itself?"""
+    return (isinstance(value, type(0)) or 
+            isinstance(value, type(0.0)) or
+            isinstance(value, type("")) or
+            callable(value))
+
+def _compile_error(e):
+    """Return code that raises the given exception."""
+    def code(environ):
+        raise e
+    return code
+
+def _compile_literal(value):
+    """Return code that evaluates to value itself."""
+    def code(environ):
+        return value
+    return code
+
+def _compile_symbol(value, scope):
+    """Return code that looks up the symbol in the environ.
+
+    If the symbol is a parameter, look in its slot.  Only if the parameter
+    has been deleted, do a normal lookup.
+
+    """
+    name = value.name
+    if scope is not None and scope.has_key(name):
+        index = scope[name]
+        def code(environ):
+            val = environ.slots[index]
+            if isinstance(val, Expression):
+                val = val.evaluate()
+                environ.slots[index] = val
+            elif val is unbound:
+                return environ[name]
+            return val
+        return code
+    def code(environ):
+        return environ[name]
+    return code
+
+def _compile_assignment(value, scope):
     """(= a b)
     
     Set a to b and return b.  b will be evaluated--assignment is not lazy.
@@ -51,16 +213,43 @@ def _evaluate_assignment(value, environ):
         raise SyntaxError("invalid syntax")
     if not isinstance(value[1], Symbol):
         raise SyntaxError("can't assign to non-symbol")
-    lval, rval = value[1], evaluate(value[2], environ)
-    environ[lval.name] = rval
-    return rval
+    assign = _compile_setter(value[1], scope)
+    rval = compile_tree(value[2], scope = scope)
+    def code(environ):
+        val = rval(environ)
+        assign(environ, val)
+        return val
+    return code
+
+def _compile_setter(value, scope):
+    """Return a function that binds the Symbol value in an environ.
 
-def _evaluate_def(value, environ):
+    The function takes the environ and the value to bind.  If the symbol is a
+    parameter, set its slot, unless the parameter has been deleted.
+
+    """
+    lval = value.name
+    if scope is not None and scope.has_key(lval):
+        index = scope[lval]
+        def assign(environ, val):
+            if environ.slots[index] is unbound:
+                environ[lval] = val
+            else:
+                environ.slots[index] = val
+        return assign
+    def assign(environ, val):
+        environ[lval] = val
+    return assign
+
+def _compile_def(value, scope, create = create_function):
     """(def name(parameters...) statements...)
 
     Create a user-defined function and insert it into environ with the given
     name (unless name is "_", which is used for anonymous functions).   Return
-    the function.
+    the function.  The statements are compiled once, here, no matter how many
+    times the def is evaluated, within the scope of the new function.
+
+    create - This creates the function (see function.create_function).
 
     """
     if len(value) < 4:
@@ -69,18 +258,38 @@ def _evaluate_def(value, environ):
         raise SyntaxError("invalid syntax")
     if not isinstance(value[2], type([])):
         raise SyntaxError("invalid syntax")
-    name, statements = value[1].name, value[3:]
+    name = value[1].name
     parameters = []
     for i in value[2]:
         if not isinstance(i, Symbol):
             raise SyntaxError("invalid syntax")
         parameters.append(i.name)
-    f = create_function(name, parameters, statements)
-    if name != "_":
-        environ[name] = f
-    return f
+    slots = get_slots(parameters)
+    statements = ([compile_tree(i, scope = slots) for i in value[3:-1]] + 
+                  [compile_tree(value[-1], tail = 1, scope = slots)])
+    def code(environ):
+        f = create(name, parameters, statements)
+        if name != "_":
+            environ[name] = f
+        return f
+    return code
+
+def _compile_defmemo(value, scope):
+    """(defmemo name(parameters...) statements...)
 
-def _evaluate_del(value, environ):
+    This is like def, but the function is memoized.  See 
+    function.create_memo_function for the details, including what happens to
+    unhashable arguments.  For instance:
+
+    (defmemo fib(n) 
+      (if (< n 2) n else ((+ (fib (- n 1)) (fib (- n 2))))))
+    (.= fib maxSize 100)
+    (print (fib 100) (. fib hits) (. fib misses))
+
+    """
+    return _compile_def(value, scope, create = create_memo_function)
+
+def _compile_del(value, scope):
     """(del a)
 
     Call environ.del_local(a).  Return None.
@@ -91,35 +300,357 @@ def _evaluate_del(value, environ):
     if not isinstance(value[1], Symbol):
         raise SyntaxError("can't del a non-symbol")
     key = value[1].name
-    environ.del_local(key)
-    return None
+    def code(environ):
+        environ.del_local(key)
+        return None
+    return code
 
-def _evaluate_call(value, environ):
+def _compile_call(value, scope, tail=0):
     """(function arguments...)
     
     Evaluate function to reduce it to something that is callable.  Then, apply
-    the function to the given arguments, if any, and return the result.  If 
-    the function does not have an attribute named lazy, it needs to be wrapped
-    using create_external_function before being called.
+    the function to the given arguments, if any, and return the result.
+
+    If the function has an attribute named lazy, each argument is passed as
+    an Expression (i.e. an unevaluated argument tied to the caller's environ).
+    The arguments are compiled here, so that the Expression's can be
+    evaluated without compiling them again.  Arguments that are already
+    evaluated are passed as is (see _compile_argument).  Otherwise, it's a
+    Python function, so the arguments are evaluated, and the function is
+    called with the results directly.  That's what create_external_function
+    would do, but without creating a wrapper.
+
+    tail - Is the call in tail position?  If so, and if the function is
+    user-defined, return a TailCall instead of calling it.
+
+    Calls to builtin operators such as "+" and "<" are special-cased.  See
+    _compile_operator.
 
     """
     if len(value) < 1:
         raise SyntaxError("invalid syntax")
-    name, f, args = value[0], evaluate(value[0], environ), value[1:]
-    if not callable(f) and type(f).__name__ != "org.python.core.PyJavaClass":
-        raise TypeError("'%s' is not callable" % `name`)
-    if not hasattr(f, "lazy"):
-        f = create_external_function(f.__name__, f)
-    return f(environ, *args)
-
-# This is a dict containing a mapping from each construct (such as "=") to a 
-# handler for that construct (such as "_evaluate_def").
-constructs = {
-    "=": _evaluate_assignment,
-    "def": _evaluate_def,
-    "del": _evaluate_del,
-}
-constructs.update(get_python_constructs())
+    name, function = value[0], compile_tree(value[0], scope = scope)
+    args = [(i, compile_tree(i, scope = scope)) for i in value[1:]]
+    binders = [_compile_argument(parseTree, argCode, scope)
+               for (parseTree, argCode) in args]
+    def code(environ):
+        f = function(environ)
+        if (not callable(f) and 
+            type(f).__name__ != "org.python.core.PyJavaClass"):
+            raise TypeError("'%s' is not callable" % `name`)
+        if not hasattr(f, "lazy"):
+            return f(*[argCode(environ) for (parseTree, argCode) in args])
+        expressions = [bind(environ) for bind in binders]
+        if tail and hasattr(f, "apply"):
+            return TailCall(f.apply, environ, expressions)
+        return f(environ, *expressions)
+    return _compile_operator(value, scope, function, 
+                             [argCode for (parseTree, argCode) in args], code)
+
+def _compile_operator(value, scope, function, args, call):
+    """Return code for a call that may be to a builtin operator.
+
+    If value is a call to one of the builtins in _operators, with the right
+    number of arguments, the returned code evaluates the arguments and
+    applies the operator to them directly, rather than wrapping each one in
+    an Expression and a Parameter.  The builtins evaluate all of their
+    arguments, in order, anyway.  Since the name may be rebound at any time,
+    the code first checks that it still refers to the builtin.  If it
+    doesn't, it falls back to call.  Otherwise, just return call.
+
+    function - This is the function's parse tree, compiled.
+
+    args - This is a list of the arguments' parse trees, compiled.  They're
+    shared with call, rather than compiled again, so that compiling nested
+    operators takes linear time.
+
+    call - This is value, compiled as a normal call.
+
+    """
+    name = value[0]
+    if not isinstance(name, Symbol):
+        return call
+    op = _operators.get((name.name, len(value) - 1))
+    if op is None or (scope is not None and scope.has_key(name.name)):
+        return call
+    builtin = get_builtins_environ()[name.name]
+    if len(args) == 1:
+        a = args[0]
+        def code(environ):
+            if function(environ) is builtin:
+                return op(a(environ))
+            return call(environ)
+        return code
+    (a, b) = args
+    def code(environ):
+        if function(environ) is builtin:
+            return op(a(environ), b(environ))
+        return call(environ)
+    return code
+
+def _compile_argument(value, code, scope):
+    """Return code that returns what to pass a lazy function for an argument.
+
+    Usually, that's an Expression.  However, a literal evaluates to itself, so
+    it's passed as is.  So is the value of a parameter that has already been
+    evaluated.  Either way, no Expression is needed.
+
+    If a parameter that hasn't been evaluated yet is passed straight through,
+    its Expression is shared rather than wrapped in another one.  Otherwise,
+    recursive calls that pass a parameter on would build up a chain of
+    Expression's (each keeping its caller's Environ alive) that would all
+    have to be walked to evaluate it.
+
+    If the argument may bind names in the caller's environ (e.g. (= x 2)), the
+    environ's writers count is bumped until its Expression has been
+    evaluated, so that it isn't skipped over while it may still change (see
+    Environ.retire).
+
+    value - This is the argument's parse tree.
+
+    code - This is value, compiled.
+
+    The returned code takes the environ.
+
+    """
+    if _is_literal(value):
+        def bind(environ):
+            return value
+        return bind
+    if (isinstance(value, Symbol) and scope is not None and 
+        scope.has_key(value.name)):
+        index = scope[value.name]
+        def bind(environ):
+            val = environ.slots[index]
+            if val is unbound:
+                return Expression(environ = environ, parseTree = value, 
+                                  code = code)
+            return val
+        return bind
+    if _may_bind(value):
+        def write(environ):
+            val = code(environ)
+            environ.writers -= 1
+            return val
+        def bind(environ):
+            environ.writers += 1
+            return Expression(environ = environ, parseTree = value, 
+                              code = write)
+        return bind
+    def bind(environ):
+        return Expression(environ = environ, parseTree = value, code = code)
+    return bind
+
+def _may_bind(value):
+    """Might evaluating value bind or unbind names in its environ?
+
+    That's the case if it uses any of the constructs in _binders, anywhere.
+    A user-defined function that's called can't, since it runs in its own
+    Environ.
+
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, type([])):
+            stack.extend(value)
+        elif _binders.has_key(value):
+            return 1
+    return 0
+
+def _compile_if(value, scope, tail=0):
+    """(if test value elif test value else value)
+
+    elif, else - These keywords are only special here.  They may be given as
+    symbols or as string literals.
+
+    test - This may be anything that returns a value, including a function
+    call, of course.
+
+    value - This will be evaluated if the associated test is true or if it is
+    associated with an else.  It will be evaluated in a manner similar to the
+    body of a function (see _compile_if_body).
+
+    Here's an example:
+
+    (= wages
+      (if (is_hourly worker) (
+        (print "How much do you make per hour? ")
+        (float (raw_input))
+      ) else (
+        (print "How much do you make per year? ")
+        (float (raw_input))
+      ))
+    )
+
+    The elif/else structure is worked out here, once, so the returned code
+    only has to evaluate tests until one is true.  If none are and there's no
+    else, return None.
+
+    tail - Is the if in tail position?  If so, so is each value.
+
+    """
+    args = value[1:]
+    if len(args) < 2:
+        raise SyntaxError("invalid syntax")
+    branches = [(compile_tree(args[0], scope = scope), 
+                 _compile_if_body(args[1], scope, tail))]
+    otherwise = _compile_literal(None)
+    i = 2
+    while i < len(args):
+        keyword = _get_keyword(args[i])
+        if keyword == "elif":
+            if len(args) < i + 3:
+                raise SyntaxError("invalid syntax")
+            branches.append((compile_tree(args[i + 1], scope = scope), 
+                             _compile_if_body(args[i + 2], scope, tail)))
+            i += 3
+        elif keyword == "else":
+            if len(args) != i + 2:
+                raise SyntaxError("unexpected values after else")
+            otherwise = _compile_if_body(args[i + 1], scope, tail)
+            i += 2
+        else:
+            raise SyntaxError("'%s' is neither elif or else" % `args[i]`)
+    if len(branches) == 1:
+        (test, body) = branches[0]
+        def code(environ):
+            if test(environ):
+                return body(environ)
+            return otherwise(environ)
+        return code
+    branches = tuple(branches)
+    def code(environ):
+        for (test, body) in branches:
+            if test(environ):
+                return body(environ)
+        return otherwise(environ)
+    return code
+
+def _get_keyword(value):
+    """Return the name of the if keyword value, or None."""
+    if isinstance(value, Symbol):
+        value = value.name
+    if value in ("elif", "else"):
+        return value
+    return None
+
+def _compile_if_body(value, scope, tail):
+    """Compile the value of an if.
+
+    If value is a list, it's treated like the body of a function (see
+    compile_body), and if the if is in tail position, so is the last
+    statement.  Otherwise, it's just evaluated, and if the result is a list,
+    the last element is returned.
+
+    """
+    if isinstance(value, type([])):
+        return compile_body(value, tail = tail, scope = scope)
+    expression = compile_tree(value, scope = scope)
+    def code(environ):
+        val = expression(environ)
+        if isinstance(val, type([])):
+            val = val[-1]
+        return val
+    return code
+
+def _compile_while(value, scope):
+    """(while test statements...)
+
+    Evaluate the statements, in order, for as long as test is true.  Return
+    the value of the last statement evaluated, or None if there wasn't one.
+    Like the rest of the loops, this runs in the current environ, so it
+    doesn't cost a function call per iteration.
+
+    """
+    if len(value) < 2:
+        raise SyntaxError("invalid syntax")
+    test = compile_tree(value[1], scope = scope)
+    body = compile_body(value[2:], scope = scope)
+    def code(environ):
+        ret = None
+        while test(environ):
+            ret = body(environ)
+        return ret
+    return code
+
+def _compile_for(value, scope):
+    """(for name iterable statements...)
+
+    Bind name to each item of iterable, which may be any Python iterable, and
+    evaluate the statements each time.  Return the value of the last 
+    statement evaluated, or None if there wasn't one.  Like "=", this binds
+    name in the current environ, so it's still bound after the loop.
+
+    """
+    if len(value) < 3:
+        raise SyntaxError("invalid syntax")
+    if not isinstance(value[1], Symbol):
+        raise SyntaxError("can't assign to non-symbol")
+    assign = _compile_setter(value[1], scope)
+    iterable = compile_tree(value[2], scope = scope)
+    body = compile_body(value[3:], scope = scope)
+    def code(environ):
+        ret = None
+        for i in iterable(environ):
+            assign(environ, i)
+            ret = body(environ)
+        return ret
+    return code
+
+def _compile_dotimes(value, scope):
+    """(dotimes name count statements...)
+
+    Like (for name (xrange count) statements...), but count must be an int,
+    and no range is created.
+
+    """
+    if len(value) < 3:
+        raise SyntaxError("invalid syntax")
+    if not isinstance(value[1], Symbol):
+        raise SyntaxError("can't assign to non-symbol")
+    assign = _compile_setter(value[1], scope)
+    count = compile_tree(value[2], scope = scope)
+    body = compile_body(value[3:], scope = scope)
+    def code(environ):
+        ret = None
+        n = count(environ)
+        if not isinstance(n, type(0)):
+            raise TypeError("dotimes count must be an int, not %s" % `n`)
+        i = 0
+        while i < n:
+            assign(environ, i)
+            ret = body(environ)
+            i += 1
+        return ret
+    return code
+
+# This is a dict containing a mapping from each construct's Symbol (such as 
+# Symbol(name = "=")) to a handler for that construct (such as 
+# "_compile_def").  Each handler takes a parse tree and a scope (see 
+# compile_tree), and returns compiled code.  Since Symbol's are interned, 
+# dispatch is just an identity-hashed dict lookup.
+constructs = {}
+for (name, handler) in [
+    ("=", _compile_assignment),
+    ("def", _compile_def),
+    ("defmemo", _compile_defmemo),
+    ("del", _compile_del),
+    ("if", _compile_if),
+    ("while", _compile_while),
+    ("for", _compile_for),
+    ("dotimes", _compile_dotimes)] + get_python_constructs().items():
+    constructs[Symbol(name = name)] = handler
+del name, handler
+
+_if = Symbol(name = "if")
+
+# These are the constructs that bind or unbind names in the environ they're
+# evaluated in.  See _may_bind.
+_binders = {}
+for name in ["=", "def", "defmemo", "del", "for", "dotimes"]:
+    _binders[Symbol(name = name)] = 1
+del name
 
 
 # The following is for testing:
@@ -155,6 +686,227 @@ def _test_evaluate_del():
     assert evaluate([del_, foo], locals) == None
     assert not locals.has_key("foo")
 
+def _test_compile_tree():
+    from Environ import Environ # Circular dependency.
+    def_ = Symbol(name = "def")
+    foo = Symbol(name = "foo")
+    code = compile_tree([def_, foo])
+    try:
+        code(Environ())
+        raise AssertionError("expected a SyntaxError")
+    except SyntaxError:
+        pass
+    tree = [Symbol(name = "+"), 1, 2]
+    assert evaluate(tree, Environ()) == 3
+    assert _evaluate_cache[id(tree)][0] is tree
+    code = _evaluate_cache[id(tree)][1]
+    assert evaluate(tree, Environ()) == 3
+    assert _evaluate_cache[id(tree)][1] is code
+
+def _test_compile_argument():
+    from Environ import Environ # Circular dependency.
+    def_ = Symbol(name = "def")
+    foo = Symbol(name = "foo")
+    bar = Symbol(name = "bar")
+    spy = Symbol(name = "spy")
+    passed = []
+    def builtin_spy(environ, *args):
+        passed.extend(args)
+    builtin_spy.lazy = 1
+    locals = Environ()
+    locals["spy"] = builtin_spy
+    evaluate([spy, 1, 2.0, "three", [spy]], locals)
+    assert passed[:3] == [1, 2.0, "three"]
+    assert isinstance(passed[3], Expression)
+    del passed[:]
+    evaluate([def_, foo, [bar], [spy, bar], bar, [spy, bar]], locals)
+    evaluate([foo, [Symbol(name = "+"), 1, 2]], locals)
+    assert isinstance(passed[0], Expression)
+    assert passed[1] == 3
+    del passed[:]
+    evaluate([foo, [Symbol(name = "'"), 1, 2]], locals)
+    assert passed[1] == [1, 2]
+    del passed[:]
+    locals["inner"] = create_function("inner", ["baz"], 
+        [lambda environ: passed.append(environ.slots[0])])
+    tree = [Symbol(name = "+"), 1, 2]
+    evaluate([def_, foo, [bar], [Symbol(name = "inner"), bar]], locals)
+    evaluate([foo, tree], locals)
+    assert passed[0].parseTree is tree
+    del passed[:]
+    equals = Symbol(name = "=")
+    evaluate([spy, [equals, bar, 1], [Symbol(name = "'"), [def_]]], locals)
+    assert locals.writers == 2
+    passed[0].evaluate()
+    assert locals.writers == 1
+    assert _may_bind([foo, [bar, [equals, bar, 1]]])
+    assert not _may_bind([foo, [bar, 1], "="])
+
+def _test_compile_body():
+    from Environ import Environ # Circular dependency.
+    plus = Symbol(name = "+")
+    tree = [[plus, 1, 2], [plus, 3, 4]]
+    code = compile_body(tree)
+    assert code(Environ()) == 7
+    assert code(Environ()) == 7
+    assert tree == [[plus, 1, 2], [plus, 3, 4]]
+    assert compile_body([])(Environ()) == None
+
+def _test_evaluate_if():
+    from Environ import Environ # Circular dependency.
+    if_ = Symbol(name = "if")
+    elif_ = Symbol(name = "elif")
+    else_ = Symbol(name = "else")
+    undefined = Symbol(name = "undefined")
+    tests = [
+        ([if_, 1, 2], 2),
+        ([if_, 0, 2], None),
+        ([if_, 1, [1, 2]], 2),
+        ([if_, 1, [Symbol(name = "'"), 1, 2]], 2),
+        ([if_, 0, undefined, elif_, 1, 2], 2),
+        ([if_, 0, undefined, elif_, 0, undefined, elif_, 1, 2], 2),
+        ([if_, 0, undefined, "else", 2], 2),
+        ([if_, 0, undefined, else_, []], None)
+    ]
+    for i in tests:
+        (tree, value) = i
+        try:
+            returned = evaluate(tree, Environ())
+            assert value == returned
+        except AssertionError, e:
+            sys.stderr.write("squeamish: test failed: %s led to %s\n" % (
+                `i`, returned))
+            raise AssertionError
+    for tree in [[if_, 1], [if_, 0, 1, else_, 2, 3], [if_, 0, 1, 2, 3]]:
+        try:
+            evaluate(tree, Environ())
+            raise AssertionError("expected a SyntaxError")
+        except SyntaxError:
+            pass
+    tree = [if_, 1, [[Symbol(name = "+"), 1, 2]]]
+    assert evaluate(tree, Environ()) == 3
+    assert evaluate(tree, Environ()) == 3
+    assert tree == [if_, 1, [[Symbol(name = "+"), 1, 2]]]
+
+def _test_compile_operator():
+    from Environ import Environ # Circular dependency.
+    plus = Symbol(name = "+")
+    minus = Symbol(name = "-")
+    locals = Environ()
+    assert evaluate([plus, 1, 2], locals) == 3
+    assert evaluate([minus, 1], locals) == -1
+    assert evaluate([minus, 3, 1], locals) == 2
+    assert evaluate([Symbol(name = "<"), 1, 2], locals)
+    assert evaluate([Symbol(name = "not"), 1], locals) == False
+    tree = [plus, 1, 2]
+    locals["+"] = lambda a, b: a * 10 + b
+    assert evaluate(tree, locals) == 12
+    locals.del_local("+")
+    assert evaluate(tree, locals) == 3
+    def_ = Symbol(name = "def")
+    foo = Symbol(name = "foo")
+    evaluate([def_, foo, [plus], [plus, 1, 2]], locals)
+    assert evaluate([foo, Symbol(name = "-")], locals) == -1
+
+    # Nested operators are only compiled once each.
+    import time
+    start = time.time()
+    tree = parse("(+ 1 " * 30 + "1" + ")" * 30)
+    assert evaluate(tree, locals) == 31
+    assert time.time() - start < 5
+
+def _test_evaluate_loops():
+    from Environ import Environ # Circular dependency.
+    equals = Symbol(name = "=")
+    plus = Symbol(name = "+")
+    i = Symbol(name = "i")
+    total = Symbol(name = "total")
+    locals = Environ()
+    evaluate([equals, total, 0], locals)
+    evaluate([equals, i, 0], locals)
+    assert evaluate([Symbol(name = "while"), [Symbol(name = "<"), i, 5], 
+                     [equals, total, [plus, total, i]],
+                     [equals, i, [plus, i, 1]]], locals) == 5
+    assert locals["total"] == 10
+    assert evaluate([Symbol(name = "while"), 0], locals) == None
+    evaluate([equals, total, 0], locals)
+    assert evaluate([Symbol(name = "for"), i, [Symbol(name = "'"), 1, 2, 3], 
+                     [equals, total, [plus, total, i]]], locals) == 6
+    assert locals["i"] == 3
+    evaluate([equals, total, 0], locals)
+    assert evaluate([Symbol(name = "dotimes"), i, 100000, 
+                     [equals, total, [plus, total, i]]], locals) == 4999950000
+    assert evaluate([Symbol(name = "dotimes"), i, 0, 1], locals) == None
+    def_ = Symbol(name = "def")
+    foo = Symbol(name = "foo")
+    evaluate([def_, foo, [i], 
+              [Symbol(name = "for"), i, [Symbol(name = "'"), 4, 5], i]], 
+             locals)
+    assert evaluate([foo, 1], locals) == 5
+    try:
+        evaluate([Symbol(name = "dotimes"), i, "3"], locals)
+        raise AssertionError("expected a TypeError")
+    except TypeError:
+        pass
+
+def _test_streams():
+    from Environ import Environ # Circular dependency.
+    locals = Environ()
+    evaluate(parse("(def count(n) (cons-stream n (count (+ n 1))))"), 
+             locals)
+    evaluate(parse("(def odd(n) (% n 2))"), locals)
+    assert evaluate(parse("(take 3 (count 0))"), locals) == [0, 1, 2]
+    assert evaluate(parse("(head (tail (count 5)))"), locals) == 6
+    assert evaluate(parse(
+        "(take 3 (stream-map abs (stream-filter odd (count -4))))"), 
+        locals) == [3, 1, 1]
+    assert evaluate(parse(
+        "(list (cons-stream 1 (cons-stream 2 ())))"), locals) == [1, 2]
+    assert evaluate(parse("(take 5 (stream (xrange 3)))"), 
+                    locals) == [0, 1, 2]
+    evaluate(parse("(= s (cons-stream 1 (print \"tail\")))"), locals)
+    assert locals["s"].head == 1
+
+    # A finished function's Environ isn't skipped over while a stream's
+    # tail may still bind names in it.
+    evaluate(parse("""(def a() (= x 1) 
+        (' (cons-stream 0 (b)) (cons-stream 0 (= x 2))))"""), locals)
+    evaluate(parse("(def b() (cons-stream x (c)))"), locals)
+    evaluate(parse("(def c() x)"), locals)
+    evaluate(parse("(= streams (a))"), locals)
+    evaluate(parse("(= s1 ([] streams 0))"), locals)
+    assert evaluate(parse("(head (tail s1))"), locals) == 1
+    assert evaluate(parse("(tail ([] streams 1))"), locals) == 2
+    assert evaluate(parse("(tail (tail s1))"), locals) == 2
+
+    # Iterating over a recursively built stream doesn't keep a chain of
+    # Environ's (one per cell) alive.
+    import gc
+    iterator = iter(evaluate(parse("(count 0)"), locals))
+    for i in range(1000):
+        iterator.next()
+    gc.collect()
+    assert len([i for i in gc.get_objects() if isinstance(i, Environ)]) < 100
+
+def _test_evaluate_defmemo():
+    from Environ import Environ # Circular dependency.
+    locals = Environ()
+    evaluate(parse("""(defmemo fib(n) 
+        (if (< n 2) n else ((+ (fib (- n 1)) (fib (- n 2))))))"""), locals)
+    assert evaluate(parse("(fib 100)"), locals) == 354224848179261915075
+    assert locals["fib"].misses == 101
+    assert locals["fib"].hits == 98
+    evaluate(parse("(fib 100)"), locals)
+    assert locals["fib"].hits == 99
+    evaluate(parse("(.= fib maxSize 1)"), locals)
+    evaluate(parse("(fib 101)"), locals)
+    misses = locals["fib"].misses
+    evaluate(parse("(fib 5)"), locals)
+    assert evaluate(parse("(. fib misses)"), locals) > misses
+    evaluate(parse("(defmemo first(l) ([] l 0))"), locals)
+    assert evaluate(parse("(first (' 1 2))"), locals) == 1
+    assert locals["first"].misses == 0
+
 def _internal_tests():
     from Environ import Environ # Circular dependency.
     plus = Symbol(name = "+")
@@ -169,7 +921,7 @@ def _internal_tests():
     for i in tests:
         (s, value) = i
         try:
-            returned = evaluate(yacc.parse(s), Environ())
+            returned = evaluate(parse(s), Environ())
             assert value == returned
         except AssertionError, e:
             sys.stderr.write("squeamish: test failed: %s led to %s\n" % (
@@ -186,7 +938,7 @@ def _external_tests():
             break
         if not s:
             continue
-        print evaluate(yacc.parse(s), environ)
+        print evaluate(parse(s), environ)
 
 
 # Do some testing.
@@ -194,5 +946,13 @@ if __name__ == '__main__':
     _test_evaluate_assignment()
     _test_evaluate_def()
     _test_evaluate_del()
+    _test_compile_tree()
+    _test_compile_argument()
+    _test_compile_body()
+    _test_evaluate_if()
+    _test_compile_operator()
+    _test_evaluate_loops()
+    _test_streams()
+    _test_evaluate_defmemo()
     _internal_tests()
     _external_tests()
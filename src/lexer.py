@@ -4,6 +4,8 @@ import lex
 import sys
 import re
 
+from reader import unescape
+
 
 # This is the list of token names.
 tokens = (
@@ -31,28 +33,11 @@ def t_INT(t):
     t.value = int(t.value)
     return t
 
-# Read in a string, as in C.  The following backslash sequences have their 
-# usual special meaning: \", \\, \n, and \t.
+# Read in a string, as in C.  Backslash sequences are replaced as described in
+# reader.unescape (e.g. \", \\, \n, \t, \xNN, and \uNNNN).
 def t_STRING(t):
-    r'\"([^\\"]|(\\.))*\"'
-    escaped = 0
-    str = t.value[1:-1]
-    new_str = ""
-    for i in range(0, len(str)):
-        c = str[i]
-        if escaped:
-            if c == "n":
-                c = "\n"
-            elif c == "t":
-                c = "\t"
-            new_str += c
-            escaped = 0
-        else:
-            if c == "\\":
-                escaped = 1
-            else:
-                new_str += c
-    t.value = new_str
+    r'\"[^\\"]*(\\.[^\\"]*)*\"'
+    t.value = unescape(t.value[1:-1])
     return t
 
 # Ignore comments.
@@ -98,6 +83,7 @@ def _internal_tests():
         (r'"foo"', "STRING", "foo"),
         (r'"\""', "STRING", '"'),
         (r'"\n\t\"\\"', "STRING", "\n\t\"\\"),
+        (r'"\x41\u00e9\q"', "STRING", "A\xc3\xa9q"),
         ("#1.0\n(", "LPAREN", "("),
         ("\n\n(", "LPAREN", "("),
         ("&1", "SYMBOL", "&1"),
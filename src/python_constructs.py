@@ -8,39 +8,48 @@ Constructs such as Python imports are supported at the same level as "def" and
 import sys
 
 from Symbol import Symbol
+from Environ import Environ
 
 
 def get_python_constructs(): 
-    """Return a dict containing "construct" -> _evaluate_construct."""
+    """Return a dict containing "construct" -> _compile_construct.
+
+    See interpreter.constructs.
+
+    """
     return {
-        "pyimport": _evaluate_pyimport,
-        ".": _evaluate_attr,
-        ".=": _evaluate_attr,
-        ".?": _evaluate_attr,
-        "del.": _evaluate_attr
+        "pyimport": _compile_pyimport,
+        ".": _compile_attr,
+        ".=": _compile_attr,
+        ".?": _compile_attr,
+        "del.": _compile_attr
     }
 
-def _evaluate_pyimport(value, environ):
+def _compile_pyimport(value, scope):
     """(pyimport name)
     
     Import the name module (name is anything that resolves to a string) into
     environ.pythonGlobals (if it hasn't already been imported) so that
-    subsequent calls by environ to eval will be able to access it.
+    subsequent Python lookups by environ will be able to access it.
     environ.pythonGlobals is used instead of __main__ or __builtins__ for
     compatibility with Jython.  Return the module.
     
     """
-    from interpreter import evaluate # Circular dependency.
+    from interpreter import compile_tree # Circular dependency.
     if len(value) != 2:
         raise SyntaxError("invalid syntax")
-    name = evaluate(value[1], environ)
-    if not isinstance(name, type("")):
-        raise SyntaxError("'%s' is not a string" % name)
-    if not environ.pythonGlobals.has_key(name):
-        environ.pythonGlobals[name] = __import__(name)
-    return environ.pythonGlobals[name]
-
-def _evaluate_attr(value, environ):
+    nameCode = compile_tree(value[1], scope = scope)
+    def code(environ):
+        name = nameCode(environ)
+        if not isinstance(name, type("")):
+            raise SyntaxError("'%s' is not a string" % name)
+        if not environ.pythonGlobals.has_key(name):
+            environ.pythonGlobals[name] = __import__(name)
+            Environ.pythonVersion += 1
+        return environ.pythonGlobals[name]
+    return code
+
+def _compile_attr(value, scope):
     """(get|set|del|has)attr
 
     (. obj attribute)           # getattr
@@ -49,32 +58,42 @@ def _evaluate_attr(value, environ):
     (del. obj attribute)        # delattr
 
     attribute - This is a Symbol.
+
+    Setting or deleting an attribute may change what a Python name resolves
+    to, so bump Environ.pythonVersion (see Environ._find_python).
     
     """
-    from interpreter import evaluate # Circular dependency.
+    from interpreter import compile_tree # Circular dependency.
     function = value[0].name
     assert function in [".", ".=", ".?", "del."]
     if function == ".=":
         required_args = 4
-        rval = evaluate(value[3], environ)
     else:
         required_args = 3
     if len(value) != required_args:
         raise SyntaxError("invalid syntax")
-    obj, attribute = value[1], value[2]
-    obj = evaluate(obj, environ)
+    obj, attribute = compile_tree(value[1], scope = scope), value[2]
     if not isinstance(attribute, Symbol):
         raise SyntaxError("attributes must be Symbol's")
     attribute = attribute.name
     if function == ".":
-        return getattr(obj, attribute)
-    if function == ".=":
-        setattr(obj, attribute, rval)
-        return rval
-    if function == ".?":
-        return hasattr(obj, attribute)
-    if function == "del.":
-        delattr(obj, attribute)
+        def code(environ):
+            return getattr(obj(environ), attribute)
+    elif function == ".=":
+        rval = compile_tree(value[3], scope = scope)
+        def code(environ):
+            val = rval(environ)
+            setattr(obj(environ), attribute, val)
+            Environ.pythonVersion += 1
+            return val
+    elif function == ".?":
+        def code(environ):
+            return hasattr(obj(environ), attribute)
+    else:
+        def code(environ):
+            delattr(obj(environ), attribute)
+            Environ.pythonVersion += 1
+    return code
 
 
 # The following is for testing:
@@ -86,6 +105,7 @@ def _test_evaluate_pyimport():
     assert evaluate([pyimport, "sys"], locals) == sys
     assert locals.pythonGlobals["sys"] == sys
     assert locals.has_key("sys.version")
+    assert locals["sys.exit"] is sys.exit
     
 def _test_evaluate_attr():
     from Environ import Environ # Circular dependency.
@@ -105,6 +125,10 @@ def _test_evaluate_attr():
     assert evaluate([dotQuestion, UserList, foo], locals)
     evaluate([delDot, UserList, foo], locals)
     assert not evaluate([dotQuestion, UserList, foo], locals)
+    evaluate([dotEquals, UserList, foo, len], locals)
+    assert locals["UserList.foo"] is len
+    evaluate([dotEquals, UserList, foo, str], locals)
+    assert locals["UserList.foo"] is str
  
 
 # Do some testing.
@@ -0,0 +1,195 @@
+"""This file contains the reader, which turns source code into parse trees.
+
+It accepts the same tokens as lexer.py, and builds the same trees as the PLY
+grammar did (list -> LPAREN nodes RPAREN), but it does it by hand, in one
+pass.  Each token is matched with a single regular expression, and it goes
+straight into the tree being built.  Open lists are kept on an explicit
+stack, so nesting depth isn't limited by Python's recursion limit.
+
+A parse tree is a list of ints, floats, strings, Symbol's, and other such
+lists.
+
+"""
+
+import re
+
+from Symbol import Symbol
+
+
+# This matches one token, or a run of ignored characters.  The alternatives
+# are tried in the same order that lexer.py's rules are, so, for instance,
+# "-1" is an int, but "-" and "-a" are symbols.
+_token = re.compile(
+    r'(?P<ignore>[ \t]+)|'
+    r'(?P<float>-?\d+\.\d*(?:e-?\d+)?)|'
+    r'(?P<int>-?\d+)|'
+    r'(?P<string>"[^\\"]*(?:\\.[^\\"]*)*")|'
+    r'(?P<comment>#[^\n]*)|'
+    r'(?P<newline>\n+)|'
+    r'(?P<symbol>[^0-9()][^()\ \t\n]*)|'
+    r'(?P<lparen>\()|'
+    r'(?P<rparen>\))')
+
+# This matches a backslash sequence in a string.  See unescape.
+_escape = re.compile(r'\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|[0-7]{1,3}|.)')
+_escapes = {"a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", 
+            "t": "\t", "v": "\v"}
+
+
+def parse(s):
+    """Parse s, which must contain exactly one list, and return its tree."""
+    forms = parse_all(s)
+    if len(forms) != 1:
+        raise SyntaxError("invalid syntax")
+    return forms[0]
+
+def parse_all(s):
+    """Parse s, which may contain any number of lists, and return their trees.
+
+    Raise a SyntaxError if there's anything else, or if a list isn't closed.
+
+    """
+    forms = []
+    pos = 0
+    while 1:
+        (tree, pos) = read(s, pos)
+        if tree is None:
+            return forms
+        forms.append(tree)
+
+def read(s, pos = 0):
+    """Read the next list in s, starting at pos.
+
+    Return (tree, pos), where pos is just after the end of the list.  If there
+    are no more lists, return (None, len(s)).  Comments and whitespace are
+    skipped.  Anything else raises a SyntaxError, as does a list that isn't
+    closed.  Hence, a program can be read (and run) one list at a time.
+
+    """
+    stack = []
+    current = None
+    match = _token.match
+    end = len(s)
+    while pos < end:
+        m = match(s, pos)
+        if m is None:
+            _raise_error(s, pos)
+        kind = m.lastgroup
+        if kind == "lparen":
+            stack.append(current)
+            current = []
+        elif kind == "rparen":
+            if current is None:
+                _raise_error(s, pos)
+            value, current = current, stack.pop()
+            if current is None:
+                return (value, m.end())
+            current.append(value)
+        elif kind == "symbol":
+            if current is None:
+                _raise_error(s, pos)
+            current.append(Symbol(name = m.group()))
+        elif kind == "int" or kind == "float" or kind == "string":
+            if current is None:
+                _raise_error(s, pos)
+            current.append(_convert(kind, m.group()))
+        pos = m.end()
+    if current is not None:
+        raise SyntaxError("unexpected end of input")
+    return (None, end)
+
+def unescape(s):
+    """Return s with its backslash sequences replaced.
+
+    As in C (and Python), \\a, \\b, \\f, \\n, \\r, \\t, and \\v stand for
+    control characters, \\ooo (one to three octal digits, e.g. \\0 or \\012)
+    and \\xNN stand for the character with the given octal or hex code, and
+    \\uNNNN stands for the given Unicode character, encoded in UTF-8.
+    Otherwise, the backslash just means take the next character literally
+    (e.g. \\" or \\\\).  The work is done by one regular expression
+    substitution, so it takes linear time.
+
+    """
+    if "\\" not in s:
+        return s
+    return _escape.sub(_unescape, s)
+
+def _unescape(m):
+    """Return the string for the backslash sequence m.  See unescape."""
+    c = m.group(1)
+    if c[0] in "01234567":
+        return chr(int(c, 8) & 0xff)
+    if len(c) == 1:
+        return _escapes.get(c, c)
+    if c[0] == "x":
+        return chr(int(c[1:], 16))
+    return unichr(int(c[1:], 16)).encode("utf-8")
+
+def _convert(kind, text):
+    """Return the value of an int, float, or string token."""
+    if kind == "int":
+        return int(text)
+    if kind == "float":
+        return float(text)
+    return unescape(text[1:-1])
+
+def _raise_error(s, pos):
+    """Raise a SyntaxError for the token at pos in s."""
+    raise SyntaxError("syntax error on line %d near '%s'" %
+        (s.count("\n", 0, pos) + 1, s[pos:pos + 10]))
+
+
+# The following is for testing:
+def _internal_tests():
+    plus = Symbol(name = "+")
+    tests = [
+        ("()", []),
+        ("(+ 1 2)", [plus, 1, 2]),
+        ("(+ 1(+ 2 3))", [plus, 1, [plus, 2, 3]]),
+        ("(1234 -1234 1. -1. 0.1 0.1e-1)",
+            [1234, -1234, 1.0, -1.0, 0.1, 0.1e-1]),
+        (r'("" "foo" "\"" "\n\t\"\\" "\q")', ["", "foo", '"', '\n\t"\\', "q"]),
+        ("(# A comment (\n  &1 - -a a-1 [:]=)",
+            [Symbol(name = "&1"), Symbol(name = "-"), Symbol(name = "-a"),
+             Symbol(name = "a-1"), Symbol(name = "[:]=")]),
+        ('(12abc "a b")', [12, Symbol(name = "abc"), "a b"]),
+        (r'("\x41\x7e \u00e9\r\0\xZ")', ["A~ \xc3\xa9\r\0xZ"]),
+        (r'("\012" "\1234" "\08" "\8")', ["\n", "S4", "\08", "8"]),
+        ("(\t(\n)\n)", [[]])
+    ]
+    for (s, value) in tests:
+        assert parse(s) == value, s
+    assert parse("(+)")[0] is plus
+    assert parse_all("(1) (2)\n# Done.\n") == [[1], [2]]
+    assert parse_all("") == []
+    assert read("(1) (2)") == ([1], 3)
+    assert read("(1) (2)", 3) == ([2], 7)
+    assert read("(1) # Done.\n", 3) == (None, 12)
+    for s in ["", "(", ")", "1", "foo", "(1))", "(1) (2)", "(1) x"]:
+        try:
+            parse(s)
+            raise AssertionError("expected a SyntaxError for %s" % `s`)
+        except SyntaxError:
+            pass
+    text = "\\n" * 500000
+    assert unescape(text) == "\n" * 500000
+    tree = parse("(" * 100000 + ")" * 100000)
+    for i in range(99999):
+        tree = tree[0]
+    assert tree == []
+
+def _external_tests():
+    while 1:
+        try:
+            s = raw_input("squeamish> ")
+        except EOFError:
+            break
+        if not s:
+            continue
+        print `parse_all(s)`
+
+
+# Do some testing.
+if __name__ == '__main__':
+    _internal_tests()
+    _external_tests()
@@ -3,7 +3,8 @@
 import sys
 from traceback import print_exception
 
-from parser import yacc
+from reader import parse, read
+from sqc import load_forms
 from Environ import Environ
 from interpreter import evaluate
 
@@ -14,38 +15,52 @@ class Shell:
 
     This class reads input from either STDIN or an input file specified on the
     command line.  It then passes off complete "statements" to the interpreter.
-    It does just a little parsing to recognize multi-line statements which must
-    be passed together.
+    An input file is read all at once, and its statements are evaluated one
+    at a time.  Unless --no-cache is given, its parse trees are cached (see
+    sqc.py).  STDIN is read a line at a time, and the Shell does just a 
+    little parsing to recognize multi-line statements which must be passed
+    together.
 
     The following attributes are used: 
 
     input - This is the file handle where input is read from.
     isStdin - Is self.input == sys.stdin?
+    path - This is the path of the input file, or None.
+    useCache - Should the parse trees of the input file be cached?
     environ - This is the global Environ.
 
     """
 
     def __init__(self):
         """Do basic initialization."""
-        argvlen = len(sys.argv)
-        if argvlen > 2:
-            sys.stderr.write("usage: squeamish [file]\n")
+        args = sys.argv[1:]
+        self.useCache = "--no-cache" not in args
+        if not self.useCache:
+            args.remove("--no-cache")
+        if len(args) > 1:
+            sys.stderr.write(
+                "usage: squeamish [--no-cache] [--startup-profile] [file]\n")
             sys.exit(1)
-        if argvlen == 2:
-            self.input = open(sys.argv[1], "r")
+        if args:
+            self.path = args[0]
+            self.input = open(self.path, "r")
         else:
+            self.path = None
             self.input = sys.stdin
         self.isStdin = self.input == sys.stdin
         self.environ = Environ()
 
     def mainLoop(self):
         """This is the main loop."""
+        if not self.isStdin:
+            self.loadFile()
+            return
         while 1:
             try:
                 line = ""
                 while not self.isComplete(line):
                     line += self.readline(line)
-                value = evaluate(yacc.parse(line), self.environ)
+                value = evaluate(parse(line), self.environ)
                 if self.isStdin and value:
                     print value
             except EOFError:
@@ -54,6 +69,43 @@ class Shell:
             except:
                 print_exception(*(sys.exc_info()))
 
+    def loadFile(self):
+        """Read all of self.input, and evaluate each statement in order.
+
+        A statement that raises an exception doesn't stop the ones after it,
+        but a syntax error does, since there's no telling where the next
+        statement would start.  The statements before a syntax error are
+        still evaluated, so in that case, the statements are read (see
+        reader.read) and evaluated one at a time.
+
+        """
+        text = self.input.read()
+        self.input.close()
+        try:
+            forms = load_forms(self.path, text, self.useCache)
+        except SyntaxError:
+            forms = None
+        if forms is not None:
+            for tree in forms:
+                try:
+                    evaluate(tree, self.environ)
+                except:
+                    print_exception(*(sys.exc_info()))
+            return
+        pos = 0
+        while 1:
+            try:
+                (tree, pos) = read(text, pos)
+            except SyntaxError:
+                print_exception(*(sys.exc_info()))
+                break
+            if tree is None:
+                break
+            try:
+                evaluate(tree, self.environ)
+            except:
+                print_exception(*(sys.exc_info()))
+
     def readline(self, continuation = 0):
         """Read a line from self.input.
         
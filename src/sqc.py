@@ -0,0 +1,221 @@
+"""This file contains the cache of parsed scripts.
+
+When a script such as "foo.sqm" is run, its parse trees are saved in
+"foo.sqc", next to it.  The next time it's run, if the source hasn't changed,
+the trees are loaded from there instead of reading the source again.  Like
+Python's .pyc files, the cache is just an optimization.  If it can't be read
+or written, it's ignored.
+
+A .sqc file is a marshalled tuple:
+
+    (MAGIC, FORMAT_VERSION, VERSION, digest, symbols, forms)
+
+digest - This is the MD5 digest of the source.
+
+symbols - This is a tuple of the names of the Symbol's used by the script.
+
+forms - This is a tuple of encoded parse trees.  Each list is encoded as a
+tuple, and each Symbol is encoded as a list containing the index of its name
+in symbols.  Ints, floats, and strings are left as is.
+
+"""
+
+import marshal
+import os
+import sys
+
+from reader import parse_all
+from Symbol import Symbol
+
+
+MAGIC = "squeamish sqc"
+
+# Bump this whenever the encoding of the .sqc files changes.
+FORMAT_VERSION = 1
+
+# Bump this whenever the reader would build different trees from the same
+# source.  A change in Python's version may change marshal's format too.
+VERSION = "1 " + sys.version
+
+
+def load_forms(path, text, useCache = 1):
+    """Return the list of parse trees in the script at path.
+
+    text - This is the source of the script.  It has to be read anyway, in
+    order to check the cache.
+
+    useCache - If this is false, don't read or write the .sqc file.  The cache
+    isn't used for a script whose own name ends in .sqc either, since it
+    would be overwritten by its cache.
+
+    A SyntaxError is raised if the source can't be parsed.
+
+    """
+    cachePath = get_cache_path(path)
+    if not useCache or _is_same_file(cachePath, path):
+        return parse_all(text)
+    digest = _get_digest(text)
+    forms = _read(cachePath, digest)
+    if forms is None:
+        forms = parse_all(text)
+        _write(cachePath, digest, forms)
+    return forms
+
+def get_cache_path(path):
+    """Return the path of the .sqc file for the script at path."""
+    (root, ext) = os.path.splitext(path)
+    return root + ".sqc"
+
+def _is_same_file(a, b):
+    """Are the paths a and b the same?"""
+    return (os.path.normcase(os.path.abspath(a)) ==
+            os.path.normcase(os.path.abspath(b)))
+
+def _get_digest(text):
+    """Return the MD5 digest of text, as a hex string.
+
+    hashlib is only imported when it's needed, so that starting up without
+    the cache (e.g. for STDIN) doesn't pay for it.
+
+    """
+    try:
+        from hashlib import md5
+    except ImportError: # Python < 2.5.
+        from md5 import new as md5
+    return md5(text).hexdigest()
+
+def _read(cachePath, digest):
+    """Return the trees in cachePath, or None if it isn't a valid cache.
+
+    marshal isn't meant to read arbitrary data, and a foreign file may make it
+    raise almost anything (e.g. MemoryError), so any exception is treated as
+    a cache miss.
+
+    """
+    try:
+        f = open(cachePath, "rb")
+        try:
+            data = marshal.load(f)
+        finally:
+            f.close()
+        (magic, formatVersion, version, cachedDigest, symbols, forms) = data
+        if (magic, formatVersion, version, cachedDigest) != (
+            MAGIC, FORMAT_VERSION, VERSION, digest):
+            return None
+        symbols = [Symbol(name = i) for i in symbols]
+        return [_decode(i, symbols) for i in forms]
+    except Exception:
+        return None
+
+def _write(cachePath, digest, forms):
+    """Save forms in cachePath, if possible.
+
+    The file is written under a temporary name and then renamed, so that
+    another process never sees half of it.
+
+    """
+    indexes = {}
+    symbols = []
+    try:
+        encoded = tuple([_encode(i, indexes, symbols) for i in forms])
+        data = marshal.dumps((MAGIC, FORMAT_VERSION, VERSION, digest,
+                              tuple(symbols), encoded))
+    except (ValueError, RuntimeError): # E.g. the trees are too deep.
+        return
+    tempPath = "%s.%d" % (cachePath, os.getpid())
+    try:
+        f = open(tempPath, "wb")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        if os.name != "posix" and os.path.exists(cachePath):
+            os.remove(cachePath)
+        os.rename(tempPath, cachePath)
+    except (IOError, OSError):
+        try:
+            os.remove(tempPath)
+        except OSError:
+            pass
+
+def _encode(tree, indexes, symbols):
+    """Return tree encoded for marshal.  Add new Symbol's to symbols."""
+    if isinstance(tree, type([])):
+        return tuple([_encode(i, indexes, symbols) for i in tree])
+    if isinstance(tree, Symbol):
+        index = indexes.get(tree)
+        if index is None:
+            index = indexes[tree] = len(symbols)
+            symbols.append(tree.name)
+        return [index]
+    return tree
+
+def _decode(tree, symbols):
+    """Return the tree that tree was encoded from (see _encode)."""
+    if isinstance(tree, type(())):
+        return [_decode(i, symbols) for i in tree]
+    if isinstance(tree, type([])):
+        return symbols[tree[0]]
+    return tree
+
+
+# The following is for testing:
+def _test_load_forms():
+    import tempfile
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "test.sqm")
+    cachePath = get_cache_path(path)
+    assert cachePath == os.path.join(directory, "test.sqc")
+    text = '(print "sqc" 1 2.5 (+ a a))'
+    plus, a = Symbol(name = "+"), Symbol(name = "a")
+    tree = [Symbol(name = "print"), "sqc", 1, 2.5, [plus, a, a]]
+    try:
+        assert load_forms(path, text, useCache = 0) == [tree]
+        assert not os.path.exists(cachePath)
+        assert load_forms(path, text) == [tree]
+        assert os.path.exists(cachePath)
+        assert load_forms(path, text)[0][4][0] is plus
+
+        # The cache is used as long as the source is the same.
+        digest = _get_digest(text)
+        _write(cachePath, digest, [[a]])
+        assert load_forms(path, text) == [[a]]
+
+        # Changing the source invalidates it.
+        text = "(print 2)"
+        assert load_forms(path, text) == [[Symbol(name = "print"), 2]]
+        assert _read(cachePath, _get_digest(text)) == [
+            [Symbol(name = "print"), 2]]
+
+        # So does changing the format or the version, or corrupting it.
+        _write(cachePath, _get_digest(text), [[a]])
+        data = list(marshal.load(open(cachePath, "rb")))
+        data[1] = FORMAT_VERSION + 1
+        open(cachePath, "wb").write(marshal.dumps(tuple(data)))
+        assert load_forms(path, text) == [[Symbol(name = "print"), 2]]
+        open(cachePath, "wb").write("garbage")
+        assert load_forms(path, text) == [[Symbol(name = "print"), 2]]
+        open(cachePath, "wb").write('(print "junk")')
+        assert load_forms(path, text) == [[Symbol(name = "print"), 2]]
+
+        # A script named like a cache is never overwritten by its cache.
+        scriptPath = os.path.join(directory, "script.sqc")
+        open(scriptPath, "w").write(text)
+        assert load_forms(scriptPath, text) == [[Symbol(name = "print"), 2]]
+        assert open(scriptPath).read() == text
+
+        # Syntax errors aren't cached.
+        try:
+            load_forms(path, "(print 3")
+            raise AssertionError("expected a SyntaxError")
+        except SyntaxError:
+            pass
+    finally:
+        for i in os.listdir(directory):
+            os.remove(os.path.join(directory, i))
+        os.rmdir(directory)
+
+
+# Do some testing.
+if __name__ == '__main__':
+    _test_load_forms()
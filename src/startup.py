@@ -0,0 +1,57 @@
+"""This file contains main, which starts Squeamish.
+
+Nothing is imported here at the top level (other than what Python itself
+has already loaded), so that with --startup-profile, the time it takes to
+import each part of the interpreter can be measured.
+
+"""
+
+import sys
+
+
+def main():
+    """Start the Shell.
+
+    If --startup-profile is given on the command line, time each phase of
+    startup, and write a report to STDERR before running the Shell.
+
+    """
+    if "--startup-profile" not in sys.argv:
+        from Shell import Shell
+        Shell().mainLoop()
+        return
+    sys.argv.remove("--startup-profile")
+    import time
+    times = []
+    def phase(name, f):
+        start = time.time()
+        ret = f()
+        times.append((name, time.time() - start))
+        return ret
+    phase("import reader", lambda: __import__("reader"))
+    Environ = phase("import Environ", lambda: __import__("Environ"))
+    phase("import interpreter", lambda: __import__("interpreter"))
+    Shell = phase("import Shell", lambda: __import__("Shell").Shell)
+    phase("create builtins", Environ.get_builtins_environ)
+    shell = phase("create Shell", Shell)
+    sys.stderr.write(_format_profile(times))
+    shell.mainLoop()
+
+def _format_profile(times):
+    """Return the startup profile report for the given (name, time) pairs."""
+    lines = ["squeamish: startup profile\n"]
+    total = 0
+    for (name, seconds) in times:
+        lines.append("  %-24s %8.2fms\n" % (name, seconds * 1000))
+        total += seconds
+    lines.append("  %-24s %8.2fms\n" % ("total", total * 1000))
+    return "".join(lines)
+
+
+# Do some testing.
+if __name__ == '__main__':
+    report = _format_profile([("import reader", 0.001), ("create Shell", 0.5)])
+    assert report == ("squeamish: startup profile\n"
+                      "  import reader                1.00ms\n"
+                      "  create Shell               500.00ms\n"
+                      "  total                      501.00ms\n")
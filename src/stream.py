@@ -0,0 +1,149 @@
+"""This file contains the Stream class."""
+
+from AutomaticClass import SlottedClass
+
+from Expression import Expression
+from Parameter import Parameter
+
+
+class Stream(SlottedClass):
+
+    """This is a cons cell whose tail isn't evaluated until it's needed.
+
+    A stream is either a Stream or None, which is the empty stream.  Since
+    each tail is only evaluated once, and then only when it's asked for, a
+    stream may be infinite.  Streams are iterable, so they can be passed to
+    Python (and to "for") like any other sequence.  Iterating over a stream
+    doesn't keep a reference to its head, so as long as nothing else does,
+    the cells that have been passed can be garbage collected.  So can the
+    Environ's of a user-defined function that builds a stream recursively,
+    since they're retired when it returns (see function.create_function).
+
+    The following attributes are used:
+
+    head - This is the first element.
+
+    rest - This is a Parameter (or anything else that can be called to get
+    the tail, and that remembers the result).  See tail.
+
+    """
+
+    __slots__ = ["head", "rest"]
+
+    def __init__(self, head, rest):
+        self.head = head
+        self.rest = rest
+
+    def tail(self):
+        """Return the rest of the stream, evaluating it the first time."""
+        return self.rest()
+
+    def __iter__(self):
+        return _StreamIterator(self)
+
+
+class _StreamIterator:
+
+    """This iterates over a Stream.
+
+    It only refers to the cell it returned the head of last (or to the first
+    cell, until it's started), and it doesn't evaluate the next tail until
+    it's asked for the next element.
+
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.last = None
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self.last is not None:
+            self.stream, self.last = self.last.tail(), None
+        if self.stream is None:
+            raise StopIteration
+        self.stream, self.last = None, self.stream
+        return self.last.head
+
+
+def delay(f, *args):
+    """Return something that can be used as a Stream's rest.
+
+    When it's called, it'll return f(*args), but f is only ever called once.
+    This is the same machinery lazy arguments use (see Parameter).
+
+    """
+    def code(environ):
+        return f(*args)
+    return Parameter(value = Expression(code = code))
+
+def from_iterator(iterator):
+    """Return a Stream of the items that are left in the Python iterator."""
+    for i in iterator:
+        return Stream(i, delay(from_iterator, iterator))
+    return None
+
+def take(n, stream):
+    """Return a list of the first n elements of stream (or fewer)."""
+    taken = []
+    while stream is not None and len(taken) < n:
+        taken.append(stream.head)
+        stream = stream.tail()
+    return taken
+
+def stream_map(f, stream):
+    """Return a Stream of f applied to each element of stream."""
+    if stream is None:
+        return None
+    return Stream(f(stream.head), delay(_map_tail, f, stream))
+
+def _map_tail(f, stream):
+    return stream_map(f, stream.tail())
+
+def stream_filter(f, stream):
+    """Return a Stream of the elements of stream for which f is true.
+
+    Elements are skipped in a loop, so a long run of them doesn't recurse.
+
+    """
+    while stream is not None and not f(stream.head):
+        stream = stream.tail()
+    if stream is None:
+        return None
+    return Stream(stream.head, delay(_filter_tail, f, stream))
+
+def _filter_tail(f, stream):
+    return stream_filter(f, stream.tail())
+
+
+# Do some testing.
+if __name__ == '__main__':
+    def count(n):
+        return Stream(n, delay(count, n + 1))
+    calls = []
+    def inc(n):
+        calls.append(n)
+        return n + 1
+    s = Stream(0, delay(inc, 0))
+    assert s.tail() == 1
+    assert s.tail() == 1
+    assert calls == [0]
+    assert take(3, count(0)) == [0, 1, 2]
+    assert take(3, None) == []
+    assert take(3, from_iterator(iter([1, 2]))) == [1, 2]
+    assert list(from_iterator(iter("abc"))) == ["a", "b", "c"]
+    assert take(3, stream_map(lambda n: n * n, count(1))) == [1, 4, 9]
+    assert take(3, stream_filter(lambda n: n % 2, count(0))) == [1, 3, 5]
+    assert stream_filter(lambda n: n > 10, from_iterator(iter(range(5)))) == \
+        None
+    assert take(2, stream_filter(lambda n: n % 1000 == 999, count(0))) == [
+        999, 1999]
+    for i in stream_filter(lambda n: n == 5, count(0)):
+        break
+    assert i == 5
+    total = 0
+    for i in from_iterator(iter(xrange(100000))):
+        total += i
+    assert total == 4999950000
@@ -1,36 +1,46 @@
 """This file contains the Symbol class."""
 
-from AutomaticClass import AutomaticClass
 
+# This maps names to Symbol's.  See Symbol.__new__.
+_symbols = {}
 
-class Symbol(AutomaticClass):
+
+class Symbol(object):
 
     """This class represents a symbol in the parse tree.
+
+    Symbols are interned.  That is, there is only ever one Symbol with a given
+    name; Symbol(name = "+") always returns the same instance.  Hence, two
+    symbols are equal only if they are the same object, and they hash by
+    identity.  This makes them cheap to compare and to use as dict keys.
     
     The following attributes are used:
 
-    name - This is the name of the symbol.
+    name - This is the name of the symbol.  Don't change it.
 
     """
 
-    def getAttributes(self):
-        return AutomaticClass.getAttributes(self) + ["name"]
-
-    def __eq__(self, other):
-        """Two symbols are equal if they have the same name."""
-        return self.name == other.name
+    __slots__ = ["name"]
 
-    def __ne__(self, other):
-        """Two symbols are not equal if they have different names."""
-        return self.name != other.name
+    def __new__(cls, name):
+        """Return the Symbol with the given name, creating it if necessary."""
+        symbol = _symbols.get(name)
+        if symbol is None:
+            symbol = object.__new__(cls)
+            symbol.name = name
+            _symbols[name] = symbol
+        return symbol
 
-    def __hash__(self):
-        return hash(`self`)
+    def __repr__(self):
+        return "<Symbol name=%s>" % self.name
 
 
 # Do some testing.
 if __name__ == '__main__':
     assert Symbol(name = "+") == Symbol(name = "+")
+    assert Symbol(name = "+") is Symbol(name = "+")
     assert Symbol(name = "+") != Symbol(name = "-")
     assert not (Symbol(name = "+") != Symbol(name = "+"))
     assert hash(Symbol(name = "+")) == hash(Symbol(name = "+"))
+    assert Symbol(name = "+") != "+"
+    assert `Symbol(name = "+")` == "<Symbol name=+>"